@@ -0,0 +1,152 @@
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import requests
+
+from httpClient import fetch_json
+from metrics import METRICS
+
+
+CACHE_DB_PATH = 'cache/openf1.sqlite'
+
+# how long a non final response (e.g. the session list) can be reused without asking the api again,
+# this is what makes the second /sessions call of the same refresh free
+DEFAULT_MAX_AGE = 60
+# results of a session are considered final (and never downloaded again) this long after its date_end,
+# gives the api time to apply penalties and the session_result endpoint time to catch up
+FINALIZE_DELAY = 6 * 3600
+# a session past FINALIZE_DELAY whose session_result is still empty only has the /position fallback, which is the last
+# position on track without penalties: both are asked again this often until the official classification shows up
+PROVISIONAL_MAX_AGE = 3600
+
+
+def _connect():
+    """
+    Open the cache database, creating it the first time
+    A new connection is used for every operation so the cache can be shared between threads and gunicorn workers
+    """
+    db_dir = os.path.dirname(CACHE_DB_PATH)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(CACHE_DB_PATH, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            body TEXT NOT NULL,
+            final INTEGER NOT NULL,
+            fetched_at REAL NOT NULL
+        )
+    ''')
+    return conn
+
+
+def cache_key(endpoint, params):
+    """
+    Build the cache key from the endpoint and the (sorted) request parameters
+    """
+    return endpoint + '?' + urlencode(sorted((params or {}).items()))
+
+
+def lookup(endpoint, params):
+    """
+    Return (data, final, fetched_at) for a cached response, or None if it was never stored
+    """
+    with _connect() as conn:
+        row = conn.execute('SELECT body, final, fetched_at FROM responses WHERE key = ?', (cache_key(endpoint, params),)).fetchone()
+    if row is None:
+        return None
+    return json.loads(row[0]), bool(row[1]), row[2]
+
+
+def store(endpoint, params, data, final=False):
+    """
+    Save a response, final responses are never revalidated
+    """
+    with _connect() as conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO responses (key, body, final, fetched_at) VALUES (?, ?, ?, ?)',
+            (cache_key(endpoint, params), json.dumps(data), int(final), time.time())
+        )
+
+
+def get_json(endpoint, params=None, final=False, max_age=DEFAULT_MAX_AGE, fetch=None):
+    """
+    Get the json body of an openf1 endpoint going through the on-disk cache
+
+    - responses stored as final are returned straight from the cache, no network at all
+    - other responses are reused for max_age seconds, then asked again to the api
+    - final=True marks the response as permanent, but only if it is not empty( results may simply not be in yet)
+    - requests go through httpClient( pooled connections, rate limit, retries), a query with no results gives []
+    - if the api is still unreachable or answers with an error the last cached copy is returned, if there is one
+    - fetch( optional) replaces the plain download: it gets the previously cached data( or None) and returns the new data,
+      for responses that are reduced before being stored or that only need the part newer than the cached one
+    """
+    params = params or {}
+    cached = lookup(endpoint, params)
+    if cached is not None:
+        data, is_final, fetched_at = cached
+        if is_final or (time.time() - fetched_at) <= max_age:
+            METRICS.inc('cache_lookups_total', endpoint=endpoint, result='hit')
+            return data
+    METRICS.inc('cache_lookups_total', endpoint=endpoint, result='miss' if cached is None else 'stale')
+
+    try:
+        if fetch is not None:
+            data = fetch(cached[0] if cached is not None else None)
+        else:
+            data = fetch_json(endpoint, params)
+    except requests.exceptions.RequestException as e:
+        if cached is not None:
+            print(f"Could not revalidate /{endpoint} {params} ({e}), using cached copy")
+            METRICS.inc('cache_lookups_total', endpoint=endpoint, result='stale_served')
+            return cached[0]
+        raise
+
+    store(endpoint, params, data, final=final and data != [])
+    return data
+
+
+def parse_date(value):
+    """
+    Parse an openf1 date( iso format, utc when no offset is given), None if missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date
+
+
+def session_is_final(session):
+    """
+    True if enough time passed since the end of the session for its results to never change again
+    """
+    end = parse_date(session.get('date_end'))
+    if end is None:
+        return False
+    return (datetime.now(timezone.utc) - end).total_seconds() > FINALIZE_DELAY
+
+
+def session_has_ended(session):
+    """
+    True if the session is over, from then on it must have results
+    """
+    end = parse_date(session.get('date_end'))
+    return end is not None and end <= datetime.now(timezone.utc)
+
+
+def session_has_started(session):
+    """
+    True if the session already started, sessions in the future can't have results
+    """
+    start = parse_date(session.get('date_start'))
+    return start is not None and start <= datetime.now(timezone.utc)
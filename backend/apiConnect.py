@@ -1,52 +1,92 @@
 import requests
 import json
+import os
 from datetime import datetime
-import matplotlib.pyplot as plt
-import numpy as np
-import time
-
-
-# F1 Points system
-RACE_POINTS = {
-    1: 25, 2: 18, 3: 15, 4: 12, 5: 10, 6: 8, 7: 6, 8: 4, 9: 2, 10: 1
-}
-
-SPRINT_POINTS = {
-    1: 8, 2: 7, 3: 6, 4: 5, 5: 4, 6: 3, 7: 2, 8: 1
-}
+from concurrent.futures import ThreadPoolExecutor
+from apiCache import get_json, parse_date, session_is_final, session_has_started, session_has_ended, DEFAULT_MAX_AGE, PROVISIONAL_MAX_AGE
+from httpClient import stream_json_array, UpstreamError
+from seasonModel import SeasonModel, RACE_POINTS, SPRINT_POINTS, NO_ENTRY
+from lruCache import ByteLRU
+from driverRegistry import REGISTRY
+from metrics import METRICS
+
+# aggregated standings of the finalized part of each season, used by the incremental mode
+SEASON_CHECKPOINT_PATH = 'cache/season_{year}.json'
+
+# sessions are downloaded in parallel by this many threads, the actual request rate is bounded by httpClient.RATE_LIMIT
+MAX_FETCH_WORKERS = 8
+
+# a session that is over but comes back with no results from both endpoints is asked again this many times( bypassing
+# the cache) before the refresh gives up, an empty answer is openf1 being flaky, not the session having no results
+EMPTY_RESULTS_RETRIES = 3
+
+# models of seasons that are over and completely final, they can't change anymore so they are kept in memory
+# ( up to this many bytes, least recently used first out) and given back without even asking the api for the session list
+SEASON_MODEL_CACHE = ByteLRU(8 * 2**20)
+# seasons whose last get_season_model( incremental) had every session applied, final and from session_result
+complete_seasons = set()
+
+def season_is_final(year):
+    """
+    True if the season as last built can't change anymore, a season that isn't( sessions missing, or only known from the
+    /position fallback) must not be kept for good
+    """
+    return year in complete_seasons
 
-def get_all_season_results(year=2026, debug=False):
+def get_all_season_results(year=2026, debug=False, incremental=False, verify=False):
     """
     Fetches all F1 race and sprint results for the specified season
     Returns three dictionaries:
     1. driver_positions: {driver_number: [list of positions]}
     2. driver_points: {driver_number: total_points}
     3. driver_names: {driver_number: name_acronym}
+
+    With incremental=True the standings are resumed from the checkpoint of the finalized sessions saved by the
+    previous call, and only the sessions after it are applied
+    With verify=True the incremental result is compared with a full rebuild, the full rebuild is returned
     """
-    
-    driver_positions = {}
-    driver_points = {}
+
+    if verify:
+        return verify_incremental_results(year, debug)
+
+    model, driver_names, driver_teams, driver_colors = get_season_model(year, debug=debug, incremental=incremental)
+    with METRICS.timer('standings'):
+        return model.to_season_results(driver_names, driver_teams, driver_colors)
+
+def get_season_model(year=2026, debug=False, incremental=False):
+    """
+    Same as get_all_season_results, but gives the season as a SeasonModel( numpy matrices, see seasonModel.py)
+    Returns model, driver_names, driver_teams, driver_colors
+    The model only has the sessions with results( none of the upcoming ones) and the dictionaries are in the order the
+    drivers first appear in the results, see the README
+    With incremental=True a past season that was already found complete comes from SEASON_MODEL_CACHE, don't modify it
+    """
+
+    if incremental:
+        cached = SEASON_MODEL_CACHE.get(year)
+        if cached is not None:
+            return cached
+
+    checkpoint = load_season_checkpoint(year) if incremental else None
+    checkpoint_open = incremental  # still applying the run of finalized sessions that goes in the checkpoint
+    new_checkpoint = None
+    last_session_key = None
+
+    model = SeasonModel()
     driver_names = {}
     driver_teams = {}
     driver_colors = {}
-    driver_history = {}
-    session_names = []
-    sessionCounter = 0
-    
+
     try:
         print(f"Fetching all sessions for {year}...")
         
-        # Get all sessions for the year
-        sessions_url = "https://api.openf1.org/v1/sessions"
-        params = {'year': year}
-        
-        sessions_response = requests.get(sessions_url, params=params)
-        sessions_response.raise_for_status()
-        sessions = sessions_response.json()
+        # Get all sessions for the year, this is the only call that is always revalidated
+        with METRICS.timer('sessions_fetch'):
+            sessions = get_json('sessions', {'year': year})
         
         if not sessions:
             print(f"No sessions found for {year}")
-            return driver_positions, driver_points, driver_names
+            return model, driver_names, driver_teams, driver_colors
         
         # Filter for Race and Sprint sessions only
         race_sessions = [s for s in sessions if s.get('session_type') in ['Race'] and 
@@ -56,81 +96,93 @@ def get_all_season_results(year=2026, debug=False):
         
         # Sort sessions by date
         race_sessions.sort(key=lambda x: x['date_start'])
-        
+        season_sessions = race_sessions
+
+        # Resume from the checkpoint, only the sessions that come after it are applied
+        if checkpoint is not None:
+            session_keys = [s['session_key'] for s in race_sessions]
+            if checkpoint['last_session_key'] in session_keys:
+                model, driver_names, driver_teams, driver_colors = unpack_season_state(checkpoint)
+                last_session_key = checkpoint['last_session_key']
+                race_sessions = race_sessions[session_keys.index(last_session_key) + 1:]
+                print(f"Resuming from checkpoint after session {last_session_key}, {len(race_sessions)} sessions left")
+            else:
+                print("Checkpoint does not match the session list, rebuilding the whole season")
+                checkpoint = None
 
         print(race_sessions)#########################################################################################################################################################
-        # analyze each session one by one
+
+        # Download the results of every session that already started in parallel( the rate limiter in apiCache keeps
+        # the request rate in check), they are then applied one by one in date order below
+        started_sessions = []
         for session in race_sessions:
+            if not session_has_started(session):
+                break
+            started_sessions.append(session)
+
+        executor = ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS)
+        try:
+            # drivers of every session that started( the checkpointed ones too), usually all in the registry already
+            season_started = [s for s in season_sessions if session_has_started(s)]
+            registry_future = executor.submit(REGISTRY.update, year, season_started, {s['session_key'] for s in season_started if session_is_final(s)})
+            results_futures = [executor.submit(fetch_session_positions, session) for session in started_sessions]
 
-            # Get sessions details
-            session_key = session['session_key']
-            session_name = session.get('session_name', 'Unknown')
-            meeting_name = session.get('country_name', 'Unknown')
-            is_sprint = session_name == 'Sprint'
+            # analyze each session one by one
+            for session, results_future in zip(started_sessions, results_futures):
 
+                # Get sessions details
+                session_key = session['session_key']
+                session_name = session.get('session_name', 'Unknown')
+                meeting_name = session.get('country_name', 'Unknown')
+                is_sprint = session_name == 'Sprint'
+                # only finalized sessions can go in the checkpoint
+                final = session_is_final(session)
 
-            #moved this all to the beginning of the session analysis loop in order to not add the name if the session has no available results
-            time.sleep(0.5)  # To avoid hitting API rate limits
 
-            # Method 1: session_result endpoint
+                # Positions either with method 1( session_result endpoint) or method 2 (position endpoint)
 #            print(session_key) #########################################################################################################################################################
-            session_result_response = requests.get(
-                "https://api.openf1.org/v1/session_result",
-                params={'session_key': session_key}
-            )
-
-            if session_result_response.status_code == 200 and session_result_response.json() != []:
-#                print('a')#########################################################################################################################################################
-                positions = session_result_response.json()
-                cleaned_positions = remove_padding(positions)
-            elif session_result_response.status_code == 200 and session_result_response.json() == []:
-#                print('b')#########################################################################################################################################################
-                # Method 2: position endpoint
-                cleaned_positions = get_session_result_position_endpoint(session_key) ### YOU GOT TO HERE DUMBASS YOU GOTTA ADD TEH DATA PROCESSING USING CLEAD POSITIONS AS DATA INPUT AND CHECK FOR GOOD INPUT AND THE REST SHOULD EB GOOD
-            else:
+                # if the api kept failing even after the retries this raises: better no plots than a season cut short
+                cleaned_positions, official = results_future.result()
+
+                if not cleaned_positions:
 #                print('c')#########################################################################################################################################################
-                break
+                    if not session_has_ended(session):
+                        # no results yet( the session is still running), the ones after it can't have any either
+                        break
+                    # over for more than FINALIZE_DELAY and still nothing( fetch_session_positions raises before that):
+                    # skipped so the rest of the season still shows, the checkpoint stops before it so it is asked again
+                    if checkpoint_open:
+                        checkpoint_open = False
+                        new_checkpoint = pack_season_state(model, driver_names, driver_teams, driver_colors, last_session_key)
+                    continue
 
 #            print(cleaned_positions)######################################################################################################################################################
 
+                # The checkpoint stops at the first session whose results can still change: not final yet, or only known
+                # from the /position fallback( the official results replace it when session_result has them)
+                if checkpoint_open and not (final and official):
+                    checkpoint_open = False
+                    new_checkpoint = pack_season_state(model, driver_names, driver_teams, driver_colors, last_session_key)
+
 
             
-            # Obtain a usable, understandable and UNIQUE name to be used for each session
-            nameToBeUsed = meeting_name if session.get('country_code', 'Unknown') != 'ITA' and session.get('country_code') != 'USA' and session.get('country_code') != 'ESP' else session.get('circuit_short_name', 'Unknown')
-            if nameToBeUsed == 'United Kingdom':
-                nameToBeUsed = 'UK'
-            if nameToBeUsed == 'United Arab Emirates':
-                nameToBeUsed = 'UAE'
-            session_names.append(nameToBeUsed if not is_sprint else nameToBeUsed + " Sprint")
-
-            # Debug output
-            if debug:
-                print(f"\nDebug: Processing session {session_key} - {nameToBeUsed} - {session_name}")
+                # Obtain a usable, understandable and UNIQUE name to be used for each session
+                nameToBeUsed = meeting_name if session.get('country_code', 'Unknown') != 'ITA' and session.get('country_code') != 'USA' and session.get('country_code') != 'ESP' else session.get('circuit_short_name', 'Unknown')
+                if nameToBeUsed == 'United Kingdom':
+                    nameToBeUsed = 'UK'
+                if nameToBeUsed == 'United Arab Emirates':
+                    nameToBeUsed = 'UAE'
+                session_label = nameToBeUsed if not is_sprint else nameToBeUsed + " Sprint"
+
+                # Debug output
+                if debug:
+                    print(f"\nDebug: Processing session {session_key} - {nameToBeUsed} - {session_name}")
             
-            # Get driver names for this session (if we don't have them yet)
-            if not driver_names:
-                drivers_response = requests.get(
-                    "https://api.openf1.org/v1/drivers",
-                    params={'session_key': session_key}
-                )
-                if drivers_response.status_code == 200:
-                    drivers_data = drivers_response.json()
-                    for driver in drivers_data:
-                        driver_num = driver.get('driver_number')
-                        name_acronym = driver.get('name_acronym')
-                        team_name = driver.get('team_name', 'Unknown Team')
-                        color = driver.get('team_colour', '#777777')  # Default to grey if no color provided
-                        if driver_num and name_acronym:
-                            driver_names[driver_num] = name_acronym
-                        if driver_num and team_name:
-                            driver_teams[driver_num] = team_name
-                        if driver_num and color:
-                            driver_colors[driver_num] = color
 
 
+                # Get positions for this sessions, either with method 1( session_result endpoint) or method 2 (position endpoint)
 
 
-            # Get positions for this sessions, either with method 1( session_result endpoint) or method 2 (position endpoint)
 
 
 
@@ -142,52 +194,170 @@ def get_all_season_results(year=2026, debug=False):
 
 
 
+                # Add the positions as a new column of the season model, points and history are computed from it in one go
+                # (drivers with no position in this session are assumed not to have participated)
+                model.add_session(session_key, session_label, is_sprint, cleaned_positions)
 
+                if debug:
+                    points_table = SPRINT_POINTS if is_sprint else RACE_POINTS
+                    for driver_num, position in cleaned_positions.items():
+                        print(f"  Driver {driver_num}: {f'P{position}' if position not in ['dnf', 'dsq', 'dns'] else position} ({points_table.get(position, 0)} pts)")
+
+                last_session_key = session_key
+
+            # names, teams and colours from the driver registry, in memory unless a session is new
+            with METRICS.timer('driver_resolution'):
+                registry_future.result()
+                resolve_driver_details(model, year, driver_names, driver_teams, driver_colors)
+        finally:
+            # nothing is left waiting on sessions after a failed one, whatever went wrong
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+        if checkpoint_open:
+            new_checkpoint = pack_season_state(model, driver_names, driver_teams, driver_colors, last_session_key)
+        if new_checkpoint is not None and new_checkpoint['last_session_key'] is not None and (checkpoint is None or new_checkpoint['last_session_key'] != checkpoint['last_session_key']):
+            save_season_checkpoint(year, new_checkpoint)
+
+        # a season of the past with every session applied and final is done for good
+        complete = checkpoint_open and (not race_sessions or last_session_key == race_sessions[-1]['session_key'])
+        if complete:
+            complete_seasons.add(year)
+        else:
+            complete_seasons.discard(year)
+        if incremental and complete and year < datetime.now().year:
+            SEASON_MODEL_CACHE.put(year, (model, driver_names, driver_teams, driver_colors), model.nbytes)
 
-            # Calculating driver's points given their position
-            for driver_num, position in cleaned_positions.items():
-                # Initialize driver data if not exists
-                if driver_num not in driver_positions:
-                    driver_positions[driver_num] = [None] * sessionCounter
-                    driver_points[driver_num] = 0
-                    driver_history[driver_num] = [0] * sessionCounter
+        return model, driver_names, driver_teams, driver_colors
 
-                
-                # Add position to driver's list
-                driver_positions[driver_num].append(position)
-                
-                # Calculate and add points
-                points_table = SPRINT_POINTS if is_sprint else RACE_POINTS
-                points = points_table.get(position, 0)
-                driver_points[driver_num] += points
-                driver_history[driver_num].append(driver_points[driver_num])
-                
-                if debug:
-                    print(f"  Driver {driver_num}: {f'P{position}' if position not in ['dnf', 'dsq', 'dns'] else position} ({points} pts)")
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching data: {e}")
+        raise
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return model, driver_names, driver_teams, driver_colors
+
+def fetch_session_positions(session):
+    """
+    Download the results of a session, with method 1( session_result endpoint) and, if it is still empty,
+    method 2( position endpoint)
+    Returns (positions, official), official False when they come from the position endpoint and can still be replaced
+    Raises a requests exception if the api can't be reached or keeps giving nothing for a session that is over( the
+    previous plots stay up), {} means there are no results yet, or that the session is over for more than FINALIZE_DELAY
+    and still has none( it is skipped, a session without results must not hold back the whole season forever)
+    """
+    for attempt in range(EMPTY_RESULTS_RETRIES + 1):
+        # the retries ask the api again even if the empty answer is still fresh in the cache
+        positions, official = fetch_session_positions_once(session, fresh=attempt > 0)
+        if positions or not session_has_ended(session):
+            return positions, official
+        METRICS.inc('empty_results_total')
+    if session_is_final(session):
+        print(f"No results for session {session['session_key']} after {EMPTY_RESULTS_RETRIES + 1} attempts, it ended at {session.get('date_end')}, skipping it")
+        METRICS.inc('skipped_sessions_total')
+        return {}, False
+    raise UpstreamError(f"No results for session {session['session_key']} after {EMPTY_RESULTS_RETRIES + 1} attempts, it ended at {session.get('date_end')}")
+
+
+def fetch_session_positions_once(session, fresh=False):
+    session_key = session['session_key']
+    # results of finished sessions never change, so they are cached permanently
+    final = session_is_final(session)
+    # an empty session_result of a final session is only asked again every PROVISIONAL_MAX_AGE
+    max_age = 0 if fresh else PROVISIONAL_MAX_AGE if final else DEFAULT_MAX_AGE
+
+    with METRICS.timer('session_result_fetch'):
+        positions = get_json('session_result', {'session_key': session_key}, final=final, max_age=max_age)
+    if positions != []:
+#        print('a')#########################################################################################################################################################
+        METRICS.inc('session_results_total', method='session_result')
+        return remove_padding(positions), True
+#    print('b')#########################################################################################################################################################
+    with METRICS.timer('position_fallback_fetch'):
+        positions = get_session_result_position_endpoint(session_key, max_age=max_age)
+    METRICS.inc('session_results_total', method='position' if positions else 'none')
+    return positions, False
+
+
+def pack_season_state(model, driver_names, driver_teams, driver_colors, last_session_key):
+    """
+    Snapshot of the aggregation state in a json friendly form( the season model columns, session names and keys)
+    Dictionaries are stored as lists of pairs so that integer keys and insertion order survive the round trip
+    """
+    return json.loads(json.dumps({
+        'last_session_key': last_session_key,
+        'model': model.to_state(),
+        'driver_names': list(driver_names.items()),
+        'driver_teams': list(driver_teams.items()),
+        'driver_colors': list(driver_colors.items()),
+    }))
+
+
+def unpack_season_state(state):
+    """
+    Inverse of pack_season_state, gives back the model and driver dictionaries get_season_model works with
+    """
+    return (
+        SeasonModel.from_state(state['model']),
+        dict(state['driver_names']),
+        dict(state['driver_teams']),
+        dict(state['driver_colors']),
+    )
 
-            for driver_num in driver_positions:
-                if driver_num not in cleaned_positions:
-                    # If driver has no position in this session, we can assume they didn't participate
-                    driver_positions[driver_num].append(None)
-                    driver_history[driver_num].append(driver_points[driver_num])
 
+def load_season_checkpoint(year):
+    """
+    Load the saved aggregation state of a season, None if there is none( or it can't be read)
+    """
+    path = SEASON_CHECKPOINT_PATH.format(year=year)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read checkpoint {path}: {e}")
+        return None
+    if 'model' not in state:
+        # written before the season model existed, rebuild it
+        return None
+    return state
+
+
+def save_season_checkpoint(year, state):
+    """
+    Write the aggregation state of a season, through a temp file so a crash can't leave half a checkpoint
+    """
+    path = SEASON_CHECKPOINT_PATH.format(year=year)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
 
 
-            sessionCounter += 1
+def verify_incremental_results(year, debug=False):
+    """
+    Check that resuming from the checkpoint gives exactly the same results as rebuilding the season from scratch
+    (same values, same types, same dictionary order), on a mismatch the checkpoint is thrown away
+    Returns the results of the full rebuild
+    """
+    incremental_results = get_all_season_results(year, debug=debug, incremental=True)
+    full_results = get_all_season_results(year, debug=debug)
 
+    if repr(incremental_results) == repr(full_results):
+        print("Incremental results are identical to the full rebuild")
+        return full_results
 
+    names = ['driver_positions', 'driver_points', 'driver_names', 'driver_teams', 'driver_colors', 'driver_history', 'session_names', 'sessionCounter']
+    for name, inc, full in zip(names, incremental_results, full_results):
+        if repr(inc) != repr(full):
+            print(f"MISMATCH in {name}:\n  incremental: {inc}\n  full:        {full}")
+    path = SEASON_CHECKPOINT_PATH.format(year=year)
+    if os.path.exists(path):
+        os.remove(path)
+    return full_results
 
-        # Fill in driver names for any remaining drivers
-        fill_missing_driver_names(driver_names, driver_teams, driver_colors, driver_positions.keys(), year)
-        
-        return driver_positions, driver_points, driver_names, driver_teams, driver_colors, driver_history, session_names, sessionCounter
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data: {e}")
-        return driver_positions, driver_points, driver_names, driver_teams, driver_colors, driver_history, session_names, sessionCounter
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        return driver_positions, driver_points, driver_names, driver_teams, driver_colors, driver_history, session_names, sessionCounter
 
 def get_final_positions(positions):
     """
@@ -230,90 +400,79 @@ def remove_padding(session_results):
     return cleaned_results
 
 
-def fill_missing_driver_names(driver_names, driver_teams, driver_colors, driver_numbers, year):
+def resolve_driver_details(model, year, driver_names, driver_teams, driver_colors):
     """
-    Try to fill in missing driver names by querying different sessions
+    Fill in name, team and team colour of every driver of the model from the driver registry( see driverRegistry.py)
+    Team and colour are the ones of the latest session the driver took part in, so a driver that changed team
+    mid-season gets the colour of the new one; a driver missing from all their sessions gets the latest of the year
     """
-    missing_drivers = [num for num in driver_numbers if num not in driver_names]
-    
-    if not missing_drivers:
-        return
-    
-    print(f"\nTrying to find names for {len(missing_drivers)} drivers({missing_drivers})...")
-    
-    try:
-        # Get a few random sessions to try to find driver names
-        sessions_response = requests.get(
-            "https://api.openf1.org/v1/sessions",
-            params={'year': year}
-        )
-        
-        if sessions_response.status_code == 200:
-            sessions = sessions_response.json()
-            # Try first few sessions
-            for session in sessions[:5]:
-                if not missing_drivers:
+    positions = model.positions
+    for row, driver_num in enumerate(model.driver_numbers):
+        details = None
+        for column in reversed(range(model.n_sessions)):
+            if positions[row, column] != NO_ENTRY:
+                details = REGISTRY.lookup(model.session_keys[column], driver_num)
+                if details is not None:
                     break
-                    
-                drivers_response = requests.get(
-                    "https://api.openf1.org/v1/drivers",
-                    params={'session_key': session['session_key']}
-                )
-                
-                if drivers_response.status_code == 200:
-                    drivers_data = drivers_response.json()
-                    for driver in drivers_data:
-                        driver_num = driver.get('driver_number')
-                        name_acronym = driver.get('name_acronym')
-                        if driver_num in missing_drivers and name_acronym:
-                            driver_names[driver_num] = name_acronym
-                            missing_drivers.remove(driver_num)
-    except Exception as e:
-        print(f"Error filling driver names with method 1: {e}")
-    
-    if missing_drivers:
-        print(f"\nTrying to find names for remaining {len(missing_drivers)} drivers with method 2...")
-        for driver_num in missing_drivers:
-            try:
-                driver_response = requests.get(f"https://api.openf1.org/v1/drivers?driver_number={driver_num}")
-                if driver_response.status_code == 200:
-                    driver_data = driver_response.json()
-                    name_acronym = driver_data[0].get('name_acronym', 'Unknown Driver')
-
-                    team_name = driver_data[0].get('team_name', 'Unknown Team')
-                    color = driver_data[0].get('team_colour', '777777')  #
-
-                    driver_names[driver_num] = name_acronym
-                    if team_name:
-                        driver_teams[driver_num] = team_name
-                    if color:
-                        driver_colors[driver_num] = color
-                    missing_drivers.remove(driver_num)
-            except Exception as e:
-                print(f"Error fetching driver name for {driver_num}: {e}")
-                driver_names[driver_num] = 'UNK'
-    
-                        
+        if details is None:
+            details = REGISTRY.lookup_year(year, driver_num)
+        if details is None:
+            print(f"No name found for driver {driver_num}")
+            continue
+        name_acronym, team_name, color = details
+        if name_acronym:
+            driver_names[driver_num] = name_acronym
+        if team_name:
+            driver_teams[driver_num] = team_name
+        if color:
+            driver_colors[driver_num] = color
+
+
+def get_session_result_position_endpoint(session_key, max_age=DEFAULT_MAX_AGE):
+    """
+    Get session results using method 2 (position endpoint)
 
+    The /position stream is parsed while it downloads and only the last record of each driver is kept( and cached),
+    the next call after max_age only asks for the records from the last one it has seen
+    Never cached as final, even for a final session: it's the order on track, the official classification( penalties,
+    disqualifications) only comes with session_result, which is asked again until it has it
+    """
+    def fetch_final_positions(previous):
+        return stream_final_positions(session_key, previous)
 
+    records = get_json('position#final', {'session_key': session_key}, max_age=max_age, fetch=fetch_final_positions)
 
-def get_session_result_position_endpoint(session_key):
+    output_dict = {}
+    for driver_number, position, _ in records or []:
+        output_dict[driver_number] = position
+    return output_dict
+
+
+def stream_final_positions(session_key, previous=None):
     """
-    Get session results using method 2 (position endpoint)
+    Last recorded position of each driver in a session, as [driver_number, position, date] records in order of first appearance
+    previous is the result of an earlier call, only the part of the stream from its newest record onwards is downloaded
     """
-    positions_response = requests.get(
-        "https://api.openf1.org/v1/position",
-        params={'session_key': session_key}
-    )
-
-    if positions_response.status_code == 200:
-        positions = positions_response.json()
-        
-        output_dict = {}
-        for i in positions:
-            output_dict[i['driver_number']] = i['position']
-        return output_dict
-    return {}
+    latest = {}
+    since = None
+    for driver_number, position, date in previous or []:
+        latest[driver_number] = [driver_number, position, date]
+        if parse_date(date) is not None and (since is None or parse_date(date) > parse_date(since)):
+            since = date
+
+    params = {'session_key': session_key}
+    if since is not None:
+        params['date>='] = since
+
+    for record in stream_json_array('position', params):
+        driver_number = record.get('driver_number')
+        if driver_number is None or record.get('position') is None:
+            continue
+        if driver_number in latest:
+            latest[driver_number][1:] = [record['position'], record.get('date')]
+        else:
+            latest[driver_number] = [driver_number, record['position'], record.get('date')]
+    return list(latest.values())
 
 
 
@@ -347,6 +506,8 @@ def print_summary(complete_standings, driver_positions, sessionCounter):
 
 def main(year = 2026, summary_printout=False, verbose=False, compact=False):
     """Main function to run the script"""
+    # only needed to show the plots interactively, the server renders through plotRenderer
+    import matplotlib.pyplot as plt
 #    year = 2025  # Change this to get different seasons
     
     print(f"Fetching complete F1 {year} season results...")
@@ -354,7 +515,10 @@ def main(year = 2026, summary_printout=False, verbose=False, compact=False):
     print("-" * 50)
     
     # Get all season data
-    driver_positions, driver_points, driver_names, driver_teams, driver_colors, driver_history, session_names, sessionCounter = get_all_season_results(year)
+    try:
+        driver_positions, driver_points, driver_names, driver_teams, driver_colors, driver_history, session_names, sessionCounter = get_all_season_results(year)
+    except requests.exceptions.RequestException:
+        driver_positions = {}
     
     if not driver_positions:
         print("No results found. This could be because:")
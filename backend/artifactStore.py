@@ -0,0 +1,366 @@
+"""
+Content-addressed store of the rendered plots and season json, shared by every host( and every worker) serving them
+
+Every artifact is stored under the sha256 of its bytes, the same bytes are stored once and whoever reads them can check
+they are the right ones; for every season and format a small pointer record says which artifacts are the current ones,
+pointer '2026/.webp' is {'digests': {'plot1': SHA256, 'plot2': SHA256}, 'year': 2026, 'inputs': ..., 'published': ...}
+and '2026/json' the same for the season json
+One process( the producer, holding the 'producer' lease) asks the api, renders and publishes, all the others( replicas)
+copy what the pointers say to their static/ and serve it from there, without ever asking the api themselves
+
+The store is picked with F1PLOTS_ARTIFACT_STORE:
+- file:PATH( default file:cache/artifacts) a directory of this host, for the workers of one machine
+- shared:PATH a directory every host mounts( NFS and the like), no flock there: leases are taken with exclusive creates
+- redis://HOST:PORT/DB anything that speaks the redis protocol( respServer.py is a stand-in for testing)
+"""
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from urllib.parse import quote, urlparse
+
+from seasonArtifacts import PLOTS, publish_file
+
+
+ARTIFACT_STORE = os.environ.get('F1PLOTS_ARTIFACT_STORE', 'file:cache/artifacts')
+# a blob no pointer names anymore is deleted this long after( a replica may be copying it right then)
+RETIRED_BLOB_GRACE = 3600
+# a lease file whose lock is older than this belongs to a process that died while holding it( shared directories)
+STALE_LOCK_SECONDS = 30
+REDIS_TIMEOUT = 5
+REDIS_PREFIX = 'f1plots:'
+
+
+class StoreError(Exception):
+    """
+    The store answered with an error, or gave back bytes that are not the ones asked for
+    """
+
+
+def digest_of(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class DirectoryStore:
+    """
+    Blobs in DIRECTORY/blobs/ab/abcd..., pointers and leases in DIRECTORY/pointers/ and DIRECTORY/leases/ as json,
+    every file written to a temp file and renamed in place( see publish_file)
+    """
+    backend = 'file'
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def blob_path(self, digest):
+        return os.path.join(self.directory, 'blobs', digest[:2], digest)
+
+    def record_path(self, kind, name):
+        return os.path.join(self.directory, kind, quote(name, safe='') + '.json')
+
+    def put(self, data):
+        """
+        Store the bytes, returns their digest( already there: nothing written, but the blob is not retired anymore)
+        """
+        digest = digest_of(data)
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            publish_file(path, data)
+        return digest
+
+    def get(self, digest):
+        try:
+            with open(self.blob_path(digest), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set_pointer(self, name, record):
+        publish_file(self.record_path('pointers', name), json.dumps(record).encode())
+
+    def get_pointer(self, name):
+        return self._read_record('pointers', name)
+
+    def retire(self, digest):
+        # nothing to do now, collect_garbage finds the blobs no pointer names
+        pass
+
+    def _read_record(self, kind, name):
+        try:
+            with open(self.record_path(kind, name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            raise StoreError(f"{kind}/{name} is not valid json: {e}")
+
+    @contextlib.contextmanager
+    def _locked(self, name):
+        path = self.record_path('leases', name) + '.lock'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def acquire_lease(self, name, owner, ttl):
+        """
+        Take the lease for ttl seconds if it is free or expired, or extend it if owner already has it; True if owner has it
+        """
+        with self._locked(name):
+            lease = self._read_record('leases', name)
+            if lease is not None and lease['owner'] != owner and lease['expires'] > time.time():
+                return False
+            publish_file(self.record_path('leases', name), json.dumps({'owner': owner, 'expires': time.time() + ttl}).encode())
+            return True
+
+    def release_lease(self, name, owner):
+        with self._locked(name):
+            lease = self._read_record('leases', name)
+            if lease is not None and lease['owner'] == owner:
+                os.remove(self.record_path('leases', name))
+
+    def collect_garbage(self, grace=RETIRED_BLOB_GRACE):
+        """
+        Delete the blobs no pointer names that weren't stored( or stored again) in the last grace seconds, returns how many
+        """
+        named = set()
+        pointers_dir = os.path.join(self.directory, 'pointers')
+        for name in os.listdir(pointers_dir) if os.path.isdir(pointers_dir) else []:
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(pointers_dir, name)) as f:
+                        named.update(json.load(f).get('digests', {}).values())
+                except (OSError, ValueError):
+                    # can't tell what it names, better keep everything
+                    return 0
+        removed = 0
+        blobs_dir = os.path.join(self.directory, 'blobs')
+        for prefix in os.listdir(blobs_dir) if os.path.isdir(blobs_dir) else []:
+            for digest in os.listdir(os.path.join(blobs_dir, prefix)):
+                path = os.path.join(blobs_dir, prefix, digest)
+                if digest not in named and not digest.startswith('.') and time.time() - os.path.getmtime(path) > grace:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+
+class SharedDirectoryStore(DirectoryStore):
+    """
+    DirectoryStore for a directory mounted by several hosts: flock doesn't reach the other hosts there, the lease
+    update is guarded by a lock file created with O_EXCL instead( removed after, and broken if a crash left it behind)
+    """
+    backend = 'shared'
+
+    @contextlib.contextmanager
+    def _locked(self, name):
+        path = self.record_path('leases', name) + '.lock'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        while True:
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) > STALE_LOCK_SECONDS:
+                        os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            os.remove(path)
+
+
+class RespClient:
+    """
+    Just enough of the redis protocol( RESP2) for the store: commands out as arrays of bulk strings, replies parsed back
+    One connection per process, opened on first use( gunicorn forks the workers after the preload) and opened again
+    once if it broke
+    """
+
+    def __init__(self, host, port, db=0, timeout=REDIS_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+
+    def connect(self):
+        conn = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.conn, self.reader, self.pid = conn, conn.makefile('rb'), os.getpid()
+        if self.db:
+            self._send('SELECT', self.db)
+            self._reply()
+
+    def _send(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        self.conn.sendall(b''.join(parts))
+
+    def _reply(self):
+        line = self.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('connection closed by the store')
+        kind, value = line[:1], line[1:-2]
+        if kind == b'+':
+            return value.decode()
+        if kind == b'-':
+            raise StoreError(value.decode())
+        if kind == b':':
+            return int(value)
+        if kind == b'$':
+            if int(value) < 0:
+                return None
+            data = self.reader.read(int(value) + 2)
+            if len(data) != int(value) + 2:
+                raise ConnectionError('connection closed by the store')
+            return data[:-2]
+        if kind == b'*':
+            return None if int(value) < 0 else [self._reply() for _ in range(int(value))]
+        raise StoreError(f'unexpected reply {line!r}')
+
+    def command(self, *args):
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.conn is None or self.pid != os.getpid():
+                        self.connect()
+                    self._send(*args)
+                    return self._reply()
+                except (OSError, ConnectionError):
+                    self.conn = None
+                    if attempt:
+                        raise
+
+
+class RedisStore:
+    """
+    Blobs, pointers and leases as keys of a redis( PREFIX blob:SHA256, pointer:NAME, lease:NAME); a retired blob gets an
+    expiry instead of being deleted, storing the same bytes again removes it
+    """
+    backend = 'redis'
+
+    def __init__(self, host, port, db=0, prefix=REDIS_PREFIX):
+        self.client = RespClient(host, port, db)
+        self.prefix = prefix
+
+    def put(self, data):
+        digest = digest_of(data)
+        key = f'{self.prefix}blob:{digest}'
+        if self.client.command('SET', key, data, 'NX') is None:
+            self.client.command('PERSIST', key)
+        return digest
+
+    def get(self, digest):
+        return self.client.command('GET', f'{self.prefix}blob:{digest}')
+
+    def set_pointer(self, name, record):
+        self.client.command('SET', f'{self.prefix}pointer:{name}', json.dumps(record))
+
+    def get_pointer(self, name):
+        data = self.client.command('GET', f'{self.prefix}pointer:{name}')
+        if data is None:
+            return None
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise StoreError(f"pointer {name} is not valid json: {e}")
+
+    def retire(self, digest):
+        self.client.command('PEXPIRE', f'{self.prefix}blob:{digest}', RETIRED_BLOB_GRACE * 1000)
+
+    def acquire_lease(self, name, owner, ttl):
+        key = f'{self.prefix}lease:{name}'
+        if self.client.command('SET', key, owner, 'NX', 'PX', int(ttl * 1000)) is not None:
+            return True
+        # ours already: extend it( if it expired in between and someone else took it, XX overwrites theirs, it's a
+        # few microseconds every SCHEDULER_INTERVAL and the worst case is two producers for one round)
+        if self.client.command('GET', key) == owner.encode():
+            return self.client.command('SET', key, owner, 'XX', 'PX', int(ttl * 1000)) is not None
+        return False
+
+    def release_lease(self, name, owner):
+        key = f'{self.prefix}lease:{name}'
+        if self.client.command('GET', key) == owner.encode():
+            self.client.command('DEL', key)
+
+    def collect_garbage(self, grace=RETIRED_BLOB_GRACE):
+        # the retired blobs expire by themselves
+        return 0
+
+
+def open_store(url=None):
+    """
+    The store of a F1PLOTS_ARTIFACT_STORE url, see the top of this file
+    """
+    url = url or ARTIFACT_STORE
+    scheme, _, rest = url.partition(':')
+    if scheme == 'file':
+        return DirectoryStore(rest)
+    if scheme == 'shared':
+        return SharedDirectoryStore(rest)
+    if scheme == 'redis':
+        parsed = urlparse(url)
+        return RedisStore(parsed.hostname or '127.0.0.1', parsed.port or 6379, int(parsed.path.strip('/') or 0))
+    raise ValueError(f"Unknown artifact store {url}, use file:PATH, shared:PATH or redis://HOST:PORT/DB")
+
+
+def load_blob(store, digest):
+    """
+    The bytes of a digest, checked against it
+    """
+    data = store.get(digest)
+    if data is None:
+        raise StoreError(f"blob {digest} is not in the store")
+    if digest_of(data) != digest:
+        raise StoreError(f"blob {digest} has the wrong content")
+    return data
+
+
+def point(store, name, record):
+    """
+    Point a pointer at new artifacts, the ones it named before and doesn't anymore are retired
+    """
+    previous = store.get_pointer(name)
+    store.set_pointer(name, record)
+    for digest in set((previous or {}).get('digests', {}).values()) - set(record['digests'].values()):
+        store.retire(digest)
+
+
+def publish_season_artifacts(store, year, artifacts, season_data, inputs=None):
+    """
+    Put every variant of both plots( artifacts as render_artifacts gives them) and the season json in the store, then
+    point the pointers of the season at them: one per format, the default png last like on disk, and the json
+    """
+    published = time.time()
+    suffixes = sorted(set(artifacts[0]) & set(artifacts[1]), key=lambda suffix: suffix == '.png')
+    for suffix in suffixes:
+        digests = {plot: store.put(variants[suffix]) for plot, variants in zip(PLOTS, artifacts)}
+        point(store, f'{year}/{suffix}', {'digests': digests, 'year': year, 'inputs': inputs, 'published': published})
+    point(store, f'{year}/json', {'digests': {'season': store.put(season_data)}, 'year': year, 'inputs': inputs, 'published': published})
+
+
+def fetch_season_artifacts(store, year, suffixes):
+    """
+    The opposite: (artifacts, season json, inputs) of a season from the store, None if a pointer is missing
+    """
+    records = {suffix: store.get_pointer(f'{year}/{suffix}') for suffix in list(suffixes) + ['json']}
+    if any(record is None for record in records.values()):
+        return None
+    artifacts = tuple({suffix: load_blob(store, records[suffix]['digests'][plot]) for suffix in suffixes} for plot in PLOTS)
+    return artifacts, load_blob(store, records['json']['digests']['season']), records['json'].get('inputs')
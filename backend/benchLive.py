@@ -0,0 +1,179 @@
+"""
+Live mode measured end to end: gunicorn( gunicorn.conf.py) against replayServer.py with a race happening right now,
+and a few browsers following it on /live
+
+    python benchLive.py [--workers 2] [--viewers 8] [--duration 120] [--speed 10] [--output live.json]
+
+The season is made up with generate_season(live=True) in a temporary directory, the replay server gives the /position
+records out as its clock( --speed times real time) gets to them; once the server is serving plots and the live state,
+viewers open /live and note when each event arrives
+- update latency: from the moment the newest record of an event was there to be polled to the moment a viewer got it
+  ( so it includes waiting for the next poll, LIVE_POLL_INTERVAL); records that were already there when the run started
+  don't count
+- upstream: requests and bytes per minute the replay server answered during the run, however many workers and viewers;
+  full_stream_bytes is what a single download of the whole /position stream of the race weighs at the end, what the
+  /position fallback of a refresh would get every time
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from loadTest import BACKEND_DIR, free_port, percentile
+from replayServer import ReplayServer, generate_season
+
+
+def get(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def wait_until_live(port, server, timeout):
+    # plots rendered and the poller following the race
+    start = time.time()
+    while time.time() - start < timeout:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {server.returncode}")
+        try:
+            if get(port, '/plot1.png')[0] == 200:
+                status, body = get(port, '/live.json')
+                if status == 200 and json.loads(body).get('live'):
+                    return time.time() - start
+        except (OSError, http.client.HTTPException, ValueError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"not live after {timeout} s")
+
+
+def viewer(port, end, events, errors):
+    """
+    Follow /live until end, reconnecting like a browser would, events gets (arrival time, seq, last_record)
+    """
+    while time.time() < end:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        try:
+            conn.request('GET', '/live', headers={'Accept': 'text/event-stream'})
+            response = conn.getresponse()
+            if response.status != 200:
+                errors.append(response.status)
+                response.read()
+                time.sleep(1)
+                continue
+            fields = {}
+            while time.time() < end:
+                line = response.readline()
+                if not line:
+                    break
+                line = line.decode().rstrip('\n')
+                if line:
+                    name, _, value = line.partition(':')
+                    fields[name] = value.lstrip(' ')
+                    continue
+                if 'data' in fields:
+                    state = json.loads(fields['data'])
+                    events.append((time.time(), state.get('seq'), state.get('last_record')))
+                fields = {}
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            errors.append(type(e).__name__)
+        finally:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the live mode against the replay server')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--viewers', type=int, default=8, help='browsers following /live')
+    parser.add_argument('--duration', type=float, default=120, help='seconds of race followed')
+    parser.add_argument('--speed', type=float, default=10, help='how much faster than real time the race goes')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the replay server waits before answering')
+    parser.add_argument('--ready-timeout', type=float, default=300)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    year = datetime.date.today().year
+    workdir = tempfile.mkdtemp(prefix='f1plots-live-')
+    fixtures = os.path.join(workdir, 'fixtures')
+    generate_season(year, fixtures, upcoming=3, live=True)
+    replay = ReplayServer(fixtures, latency=args.latency, seed=0, speed=args.speed)
+    base_url = replay.start()
+    race = next(s for s in replay.store.sessions if s['session_type'] == 'Race' and s['session_name'] == 'Race' and
+                replay.real_time(s['date_start']) <= time.time() <= replay.real_time(s['date_end']))
+
+    port = free_port()
+    env = dict(os.environ, OPENF1_BASE_URL=base_url)
+    server = subprocess.Popen(['gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'), '--pythonpath', BACKEND_DIR,
+                               '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers), '--threads', str(args.threads),
+                               'flaskServer:app'], cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        print(f"Waiting for the server to follow {race['country_name']} {race['session_name']}...", file=sys.stderr)
+        ready = wait_until_live(port, server, args.ready_timeout)
+        replay.reset_counts()
+        start = time.time()
+        end = start + args.duration
+        events = [[] for _ in range(args.viewers)]
+        errors = []
+        threads = [threading.Thread(target=viewer, args=(port, end, viewer_events, errors)) for viewer_events in events]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counts = replay.reset_counts()
+        full_stream = json.dumps(replay.store.query('position', [('session_key', '=', str(race['session_key']))],
+                                                    replay.now().isoformat()))
+    finally:
+        server.terminate()
+        server.wait()
+        replay.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = sorted((arrival - replay.real_time(last_record)) * 1000 for viewer_events in events
+                       for arrival, _, last_record in viewer_events if last_record and replay.real_time(last_record) >= start)
+    minutes = args.duration / 60
+    report = {
+        'created': time.time(),
+        'workers': args.workers,
+        'viewers': args.viewers,
+        'duration': args.duration,
+        'speed': args.speed,
+        'seconds_to_live': round(ready, 2),
+        'updates': len({seq for viewer_events in events for _, seq, _ in viewer_events}),
+        'update_latency': {
+            'events': len(latencies),
+            'p50_ms': percentile(latencies, 0.5),
+            'p90_ms': percentile(latencies, 0.9),
+            'p99_ms': percentile(latencies, 0.99),
+            'max_ms': latencies[-1] if latencies else None,
+        },
+        'viewer_errors': len(errors),
+        'upstream': {
+            'requests_per_minute': {k: round(v / minutes, 1) for k, v in counts.items() if not k.startswith(('bytes', 'injected_'))},
+            'bytes_per_minute': round(counts.get('bytes', 0) / minutes),
+            'position_bytes_per_minute': round(counts.get('bytes_position', 0) / minutes),
+            'full_stream_bytes': len(full_stream),
+        },
+    }
+    print(f"p50 {report['update_latency']['p50_ms'] or 0:.0f} ms, p99 {report['update_latency']['p99_ms'] or 0:.0f} ms, "
+          f"{report['upstream']['bytes_per_minute']} upstream bytes/min( /position {report['upstream']['position_bytes_per_minute']}) "
+          f"for {args.viewers} viewers", file=sys.stderr)
+    output = json.dumps(report, indent=1)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Time and peak memory of the /position fallback parse, before( whole body through .json()) and after( streaming)
+
+    python benchPositionParse.py                      # synthetic full race payload
+    python benchPositionParse.py recorded.json        # a /position response saved to disk
+
+Every method runs in its own process so the peak RSS of one does not hide the other
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from jsonStream import iter_json_array
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def make_synthetic_payload(path, records=200000, drivers=20):
+    """
+    Something shaped like a /position response of a full race
+    """
+    start = datetime(2024, 3, 2, 15, 0, tzinfo=timezone.utc)
+    with open(path, 'w') as f:
+        f.write('[')
+        for i in range(records):
+            record = {
+                'date': (start + timedelta(milliseconds=40 * i)).isoformat(),
+                'driver_number': i % drivers + 1,
+                'meeting_key': 1229,
+                'position': (i * 7) % drivers + 1,
+                'session_key': 9472,
+            }
+            f.write((',' if i else '') + json.dumps(record))
+        f.write(']')
+
+
+def parse_whole(path):
+    # what get_session_result_position_endpoint used to do with positions_response.json()
+    with open(path, 'rb') as f:
+        positions = json.loads(f.read())
+    output_dict = {}
+    for i in positions:
+        output_dict[i['driver_number']] = i['position']
+    return output_dict
+
+
+def parse_streaming(path):
+    def chunks():
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+    output_dict = {}
+    for record in iter_json_array(chunks()):
+        output_dict[record['driver_number']] = record['position']
+    return output_dict
+
+
+def run_one(method, path):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    result = {'whole': parse_whole, 'streaming': parse_streaming}[method](path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'method': method, 'seconds': elapsed, 'peak_rss_kb': peak, 'extra_rss_kb': peak - baseline, 'drivers': len(result)}))
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--run':
+        run_one(sys.argv[2], sys.argv[3])
+        return
+
+    tmp_path = None
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        fd, tmp_path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        make_synthetic_payload(tmp_path)
+        path = tmp_path
+
+    try:
+        print(f"Payload: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        for method in ['whole', 'streaming']:
+            out = subprocess.run([sys.executable, __file__, '--run', method, path], capture_output=True, text=True, check=True).stdout
+            result = json.loads(out)
+            print(f"{method:10s} {result['seconds']:7.3f} s   peak RSS {result['peak_rss_kb'] / 1024:7.1f} MB "
+                  f"(+{result['extra_rss_kb'] / 1024:.1f} MB for the parse)")
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
+
+
+if __name__ == '__main__':
+    main()
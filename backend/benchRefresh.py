@@ -0,0 +1,178 @@
+"""
+Time of a refresh, stage by stage, against replayServer.py instead of the real api
+
+    python benchRefresh.py [--year 2024] [--runs 5] [--latency 0.05] [--output bench.json] [--baseline old.json]
+
+The season comes from fixtures/YEAR( made up with generate_season if it isn't there), the server runs in this process
+and everything else( cache/, static/) lives in a temporary directory
+- cold: empty cache, new driver registry, like the first start on a new machine
+- warm: what every scheduled refresh after that does, the sqlite cache and the checkpoint are there but the responses that
+  are not final are too old to be used without asking again( the in-memory model of complete past seasons is dropped,
+  otherwise there would be nothing to measure)
+and for each of them get_all_season_results, the standings( plot_data_from_results), generate_plots( the png only
+render) and render_artifacts( every variant, what the server does) separately, plus the requests that reached the api
+The report is json on stdout( the progress prints of apiConnect go to stderr), with --baseline the medians are compared
+with an older report and the exit code is 1 if any stage got slower than --tolerance
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import apiCache
+import apiConnect
+import httpClient
+from driverRegistry import DriverRegistry
+from lruCache import ByteLRU
+from plotGenerator import plot_data_from_results
+from plotRenderer import render_plots, render_artifacts
+from replayServer import FIXTURES_DIR, ReplayServer, fixture_path, generate_season
+
+
+STAGES = ['get_all_season_results', 'standings', 'generate_plots', 'render_artifacts']
+# a stage is only called slower than the baseline if it also takes this many seconds more, the standings take microseconds
+MIN_SLOWDOWN = 0.005
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def expire_cached_responses():
+    # as if DEFAULT_MAX_AGE had passed since the last refresh, the final responses stay valid like they do for good
+    with apiCache._connect() as conn:
+        conn.execute('UPDATE responses SET fetched_at = 0 WHERE final = 0')
+
+
+def refresh(server, year):
+    """
+    One refresh with the timing of every stage, and the requests it made
+    """
+    server.reset_counts()
+    apiConnect.SEASON_MODEL_CACHE = ByteLRU(apiConnect.SEASON_MODEL_CACHE.max_bytes)
+    with contextlib.redirect_stdout(sys.stderr):
+        results, fetch = timed(apiConnect.get_all_season_results, year, False, True)
+        data, standings = timed(plot_data_from_results, results, year)
+        _, plots = timed(render_plots, *data)
+        _, artifacts = timed(render_artifacts, *data)
+    counts = server.reset_counts()
+    return {
+        'seconds': {'get_all_season_results': fetch, 'standings': standings, 'generate_plots': plots, 'render_artifacts': artifacts},
+        'requests': {k: v for k, v in counts.items() if not k.startswith(('bytes', 'injected_'))},
+        'injected': {k: v for k, v in counts.items() if k in ('injected_429', 'injected_empty')},
+        'bytes': counts.get('bytes', 0),
+        'sessions': len(data[4]),
+    }
+
+
+def summary(runs):
+    return {
+        'median_seconds': {stage: statistics.median(run['seconds'][stage] for run in runs) for stage in STAGES},
+        'max_seconds': {stage: max(run['seconds'][stage] for run in runs) for stage in STAGES},
+        'requests': runs[-1]['requests'],
+        'sessions': runs[-1]['sessions'],
+        'runs': runs,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """
+    Ratio of every median to the baseline's, and the stages that got slower than 1 + tolerance times( and MIN_SLOWDOWN)
+    """
+    ratios = {}
+    slower = []
+    for mode in ('cold', 'warm'):
+        for stage in STAGES:
+            old = baseline.get(mode, {}).get('median_seconds', {}).get(stage)
+            if not old:
+                continue
+            new = report[mode]['median_seconds'][stage]
+            ratios[f'{mode}.{stage}'] = round(new / old, 3)
+            if new > old * (1 + tolerance) and new - old > MIN_SLOWDOWN:
+                slower.append(f'{mode}.{stage}')
+    return {'ratios': ratios, 'slower': slower, 'tolerance': tolerance}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark a refresh against the replay server')
+    parser.add_argument('--year', type=int, default=2024)
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    parser.add_argument('--runs', type=int, default=5, help='cold and warm refreshes to measure each')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the replay server waits before answering')
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--empty-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='requests per second to the replay server, no limit by default( the real api gets RATE_LIMIT)')
+    parser.add_argument('--output', default=None, help='also write the report here')
+    parser.add_argument('--baseline', default=None, help='report of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='how much slower than the baseline is still fine')
+    args = parser.parse_args()
+
+    fixtures = os.path.abspath(args.fixtures)
+    if not os.path.exists(fixture_path(fixtures, args.year, 'sessions')):
+        print(f"No fixtures for {args.year}, generating them", file=sys.stderr)
+        generate_season(args.year, fixtures)
+    server = ReplayServer(fixtures, latency=args.latency, rate_429=args.rate_429, empty_rate=args.empty_rate, seed=0)
+    httpClient.API_BASE_URL = server.start()
+    if args.rate_limit is None:
+        httpClient.configure_rate_limit(10**6, 10**6)
+    else:
+        httpClient.configure_rate_limit(args.rate_limit)
+
+    workdir = tempfile.mkdtemp(prefix='f1plots-bench-')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        cold, warm = [], []
+        for _ in range(args.runs):
+            shutil.rmtree('cache', ignore_errors=True)
+            apiConnect.REGISTRY = DriverRegistry()
+            cold.append(refresh(server, args.year))
+            expire_cached_responses()
+            warm.append(refresh(server, args.year))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.shutdown()
+
+    report = {
+        'year': args.year,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'created': time.time(),
+        'replay': {'latency': args.latency, 'rate_429': args.rate_429, 'empty_rate': args.empty_rate, 'rate_limit': args.rate_limit},
+        'cold': summary(cold),
+        'warm': summary(warm),
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['baseline'] = compare(report, json.load(f), args.tolerance)
+
+    output = json.dumps(report, indent=1)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    if report.get('baseline', {}).get('slower'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Render time and memory growth of plotRenderer over many consecutive renders, with synthetic season data
+
+    python benchRender.py [renders]     # default 1000
+
+The season changes a bit at every render( like a refresh after a new session) so the data artists really are replaced
+"""
+import gc
+import json
+import random
+import resource
+import statistics
+import sys
+import time
+
+from matplotlib.figure import Figure
+
+from plotRenderer import render_plots, get_templates
+
+
+def synthetic_season(n_sessions, n_drivers=20, seed=0):
+    rng = random.Random(seed)
+    drivers = list(range(1, n_drivers + 1))
+    history = {d: [] for d in drivers}
+    points = {d: 0 for d in drivers}
+    for _ in range(n_sessions):
+        order = drivers[:]
+        rng.shuffle(order)
+        for position, d in enumerate(order, 1):
+            points[d] += [25, 18, 15, 12, 10, 8, 6, 4, 2, 1][position - 1] if position <= 10 else 0
+            history[d].append(points[d])
+    names = {d: f'D{d:02d}' for d in drivers}
+    colors = {d: '%06X' % (d * 0x0A0B0C % 0xFFFFFF) for d in drivers}
+    standings = sorted(points.items(), key=lambda x: x[1], reverse=True)
+    complete_standings = [(d, p, names[d], 'Team', colors[d]) for d, p in standings]
+    session_names = [f'Country{i}' for i in range(n_sessions)]
+    return complete_standings, history, names, colors, session_names
+
+
+def rss_mb():
+    # current resident set size, from /proc since ru_maxrss only gives the peak
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def count_figures():
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, Figure))
+
+
+def main():
+    renders = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    times = []
+    rss = []
+    for i in range(renders):
+        season = synthetic_season(n_sessions=10 + i % 20, seed=i)
+        start = time.perf_counter()
+        buf1, buf2 = render_plots(*season, year=2026)
+        times.append(time.perf_counter() - start)
+        buf1.close()
+        buf2.close()
+        if i % 100 == 0 or i == renders - 1:
+            gc.collect()
+            rss.append((i + 1, rss_mb()))
+
+    artists = {name: len(ax.get_children()) for name, (_, ax) in get_templates().items()}
+    gc.collect()
+    # the last 90% of the run, after the first renders warmed up the font caches etc.
+    warm = [r for n, r in rss if n > renders // 10] or [rss[-1][1]]
+    report = {
+        'renders': renders,
+        'mean_ms': statistics.mean(times) * 1000,
+        'p95_ms': sorted(times)[int(0.95 * (len(times) - 1))] * 1000,
+        'rss_mb': rss,
+        'rss_growth_after_warmup_mb': max(warm) - min(warm),
+        'live_figures': count_figures(),
+        'artists_after_last_render': artists,
+    }
+    print(json.dumps(report, indent=1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Several hosts sharing one artifact store( artifactStore.py), measured: gunicorn instances in separate directories( each
+one its own static/ and cache/, like separate machines) against replayServer.py and one store
+
+    python benchReplicas.py [--hosts 3] [--store redis|shared] [--output replicas.json]
+
+--store redis runs respServer.py as the store, --store shared a directory all the instances use
+The first instance starts alone, gets the producer lease, downloads the season and renders it; then the others start and
+- upstream: the requests the replay server got while the replicas started, synced and served, should be none
+- same bytes: /plot1.png and /plot2.png in a few formats and /season.json are asked to every instance, the sha256 of the
+  bodies and the ETags must be the same everywhere
+- past season: a replica is asked for last season( ?year=), it hands the render to the producer through the store and
+  serves the producer's files
+"""
+import argparse
+import datetime
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from loadTest import BACKEND_DIR, free_port, wait_until_serving
+from replayServer import ReplayServer, generate_season
+from respServer import RespServer
+
+
+PATHS = ['/plot1.png', '/plot2.png', '/plot1.png?format=webp&w=600', '/plot2.png?format=svg', '/season.json']
+
+
+def get(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('GET', path, headers={'Accept-Encoding': 'identity'})
+        response = conn.getresponse()
+        return response.status, response.getheader('ETag'), response.read()
+    finally:
+        conn.close()
+
+
+def start_host(directory, base_url, store_url, workers):
+    os.makedirs(directory, exist_ok=True)
+    port = free_port()
+    env = dict(os.environ, OPENF1_BASE_URL=base_url, F1PLOTS_ARTIFACT_STORE=store_url)
+    server = subprocess.Popen(['gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'), '--pythonpath', BACKEND_DIR,
+                               '--bind', f'127.0.0.1:{port}', '--workers', str(workers), 'flaskServer:app'],
+                              cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return port, server
+
+
+def wait_for(port, path, timeout):
+    start = time.time()
+    while time.time() - start < timeout:
+        try:
+            status, _, _ = get(port, path)
+            if status == 200:
+                return time.time() - start
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{path} not served after {timeout} s")
+
+
+def bodies(port, paths):
+    found = {}
+    for path in paths:
+        status, etag, body = get(port, path)
+        found[path] = {'status': status, 'etag': etag, 'sha256': hashlib.sha256(body).hexdigest()}
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure replicas sharing the artifact store against the replay server')
+    parser.add_argument('--hosts', type=int, default=3, help='gunicorn instances, the first one is the producer')
+    parser.add_argument('--workers', type=int, default=2, help='workers of every instance')
+    parser.add_argument('--store', choices=['redis', 'shared'], default='redis')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds the replay server waits before answering')
+    parser.add_argument('--ready-timeout', type=float, default=300)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    year = datetime.date.today().year
+    workdir = tempfile.mkdtemp(prefix='f1plots-replicas-')
+    fixtures = os.path.join(workdir, 'fixtures')
+    generate_season(year, fixtures, upcoming=3)
+    generate_season(year - 1, fixtures, missing_results=0)
+    replay = ReplayServer(fixtures, latency=args.latency, seed=0)
+    base_url = replay.start()
+    resp = None
+    if args.store == 'redis':
+        resp = RespServer()
+        store_url = resp.start()
+    else:
+        store_url = f"shared:{os.path.join(workdir, 'store')}"
+
+    hosts = []
+    try:
+        print(f"Producer starting( store {store_url})...", file=sys.stderr)
+        hosts.append(start_host(os.path.join(workdir, 'host0'), base_url, store_url, args.workers))
+        producer_ready = wait_until_serving(hosts[0][0], hosts[0][1], args.ready_timeout)
+        wait_for(hosts[0][0], '/season.json', args.ready_timeout)
+        producer_counts = replay.reset_counts()
+
+        print(f"{args.hosts - 1} replicas starting...", file=sys.stderr)
+        start = time.time()
+        for i in range(1, args.hosts):
+            hosts.append(start_host(os.path.join(workdir, f'host{i}'), base_url, store_url, args.workers))
+        replicas_ready = [round(wait_until_serving(port, server, args.ready_timeout), 2) for port, server in hosts[1:]]
+        for port, _ in hosts[1:]:
+            wait_for(port, '/season.json', args.ready_timeout)
+        replicas_ready_total = time.time() - start
+        seen = [bodies(port, PATHS) for port, _ in hosts]
+        replica_counts = replay.reset_counts()
+
+        past = f'/plot1.png?year={year - 1}'
+        past_ready = None
+        past_same = None
+        if args.hosts > 1:
+            print(f"Asking a replica for {year - 1}...", file=sys.stderr)
+            past_ready = round(wait_for(hosts[-1][0], past, args.ready_timeout), 2)
+            for port, _ in hosts[:-1]:
+                wait_for(port, past, args.ready_timeout)
+            past_same = len({json.dumps(bodies(port, [past])) for port, _ in hosts}) == 1
+        past_counts = replay.reset_counts()
+        health = [json.loads(get(port, '/health')[2]).get('artifact_store') for port, _ in hosts]
+    finally:
+        for _, server in hosts:
+            server.terminate()
+            server.wait()
+        replay.shutdown()
+        if resp is not None:
+            resp.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    def requests_in(counts):
+        return {k: v for k, v in counts.items() if not k.startswith(('bytes', 'injected_'))}
+
+    differing = [path for path in PATHS if len({json.dumps(found[path]) for found in seen}) > 1]
+    report = {
+        'created': time.time(),
+        'hosts': args.hosts,
+        'workers': args.workers,
+        'store': args.store,
+        'producer_seconds_to_serve': round(producer_ready, 2),
+        'producer_upstream_requests': requests_in(producer_counts),
+        'replicas_seconds_to_serve': replicas_ready,
+        'replicas_seconds_to_season_json': round(replicas_ready_total, 2),
+        'replicas_upstream_requests': requests_in(replica_counts),
+        'replicas_upstream_bytes': replica_counts.get('bytes', 0),
+        'same_bytes': not differing,
+        'differing_paths': differing,
+        'responses': seen[0],
+        'past_season': {
+            'seconds_to_serve_on_replica': past_ready,
+            'same_bytes': past_same,
+            'upstream_requests': requests_in(past_counts),
+        },
+        'artifact_store': health,
+        'store_commands': dict(resp.counts) if resp is not None else None,
+    }
+    print(f"{args.hosts - 1} replicas serving in {replicas_ready_total:.1f} s with {sum(report['replicas_upstream_requests'].values())} "
+          f"upstream requests, same bytes everywhere: {report['same_bytes']}", file=sys.stderr)
+    output = json.dumps(report, indent=1)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+
+if __name__ == '__main__':
+    main()
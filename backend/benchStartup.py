@@ -0,0 +1,93 @@
+"""
+How fast the server is back after a (re)start: import time of flaskServer and time to first byte under gunicorn
+
+    python benchStartup.py [runs]     # default 5, run it from the directory the server runs in( it serves static/ from there)
+
+- import: `import flaskServer` in a fresh interpreter( without starting the refresher), and which heavy modules it pulled in
+- ttfb: from launching gunicorn( with gunicorn.conf.py) to the first byte of /plot1.png, then the latency of the next requests
+The refresher starts as usual in the gunicorn run, it works in the background and doesn't change what is measured
+"""
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+
+HEAVY_MODULES = ['matplotlib', 'numpy', 'PIL', 'requests']
+IMPORT_PROBE = f'''
+import json, sys, time
+start = time.perf_counter()
+import flaskServer
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+'''
+
+
+def measure_import():
+    env = dict(os.environ, F1PLOTS_SCHEDULER='post_fork')
+    out = subprocess.run([sys.executable, '-c', IMPORT_PROBE], capture_output=True, text=True, check=True, env=env).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def get(port, path):
+    """
+    (status, seconds to the first byte of the response, seconds to the whole body)
+    """
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        first_byte = time.perf_counter() - start
+        response.read()
+        return response.status, first_byte, time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def measure_ttfb(requests=20):
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(['gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'flaskServer:app'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                status, first_byte, _ = get(port, '/plot1.png')
+                break
+            except OSError:
+                if time.perf_counter() - start > 60:
+                    raise RuntimeError("gunicorn did not answer within 60 s")
+                time.sleep(0.005)
+        ttfb = time.perf_counter() - start
+        latencies = [get(port, '/plot1.png')[2] for _ in range(requests)]
+    finally:
+        server.terminate()
+        server.wait()
+    return {'status': status, 'seconds_to_first_byte': ttfb, 'first_request_ttfb_ms': first_byte * 1000,
+            'next_requests_median_ms': statistics.median(latencies) * 1000}
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    imports = [measure_import() for _ in range(runs)]
+    report = {
+        'import_seconds_median': statistics.median(i['seconds'] for i in imports),
+        'heavy_modules_loaded_on_import': imports[0]['loaded'],
+        'gunicorn': [measure_ttfb() for _ in range(runs)],
+    }
+    print(json.dumps(report, indent=1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+from apiCache import DEFAULT_MAX_AGE
+from httpClient import fetch_json
+
+
+DRIVER_REGISTRY_PATH = 'cache/drivers.sqlite'
+
+
+class DriverRegistry:
+    """
+    Name, team and team colour of every driver in every Race/Sprint session, kept on disk across runs
+
+    - by (session_key, driver_number): what the driver was in that session, so a mid-season team change is seen
+    - by (year, driver_number): the latest session of the year the driver is known in, for the sessions /drivers missed
+
+    Missing sessions are downloaded in bulk( one /drivers request for a range of session keys), sessions that are final
+    are never downloaded again, so in the steady state every lookup is a dictionary access
+    """
+
+    def __init__(self, path=DRIVER_REGISTRY_PATH):
+        self.path = path
+        self.by_session = {}  # session_key -> {driver_number: (name_acronym, team_name, team_colour)}
+        self.by_year = {}  # (year, driver_number) -> (date_start, name_acronym, team_name, team_colour)
+        self.loaded = {}  # session_key -> (final, fetched_at)
+        self.read_from_disk = False
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS drivers (
+                session_key INTEGER NOT NULL,
+                driver_number INTEGER NOT NULL,
+                year INTEGER NOT NULL,
+                date_start TEXT,
+                name_acronym TEXT,
+                team_name TEXT,
+                team_colour TEXT,
+                PRIMARY KEY (session_key, driver_number)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS drivers_by_year ON drivers (year, driver_number)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS loaded_sessions (
+                session_key INTEGER PRIMARY KEY,
+                year INTEGER NOT NULL,
+                final INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        ''')
+        return conn
+
+    def _remember(self, session_key, driver_number, year, date_start, name, team, colour):
+        self.by_session.setdefault(session_key, {})[driver_number] = (name, team, colour)
+        known = self.by_year.get((year, driver_number))
+        if known is None or (date_start or '') >= (known[0] or ''):
+            self.by_year[(year, driver_number)] = (date_start, name, team, colour)
+
+    def _read(self, session_keys=None):
+        """
+        Load the registry( or only some sessions of it) from disk into memory, another process may have filled it
+        """
+        with self._connect() as conn:
+            if session_keys is None:
+                loaded = conn.execute('SELECT session_key, final, fetched_at FROM loaded_sessions').fetchall()
+                rows = conn.execute('SELECT session_key, driver_number, year, date_start, name_acronym, team_name, team_colour FROM drivers').fetchall()
+            else:
+                marks = ','.join('?' * len(session_keys))
+                loaded = conn.execute(f'SELECT session_key, final, fetched_at FROM loaded_sessions WHERE session_key IN ({marks})', session_keys).fetchall()
+                rows = conn.execute(f'SELECT session_key, driver_number, year, date_start, name_acronym, team_name, team_colour FROM drivers WHERE session_key IN ({marks})', session_keys).fetchall()
+        for session_key, final, fetched_at in loaded:
+            self.loaded[session_key] = (bool(final), fetched_at)
+        for row in rows:
+            self._remember(*row)
+
+    def _needs_fetch(self, session_key):
+        if session_key not in self.loaded:
+            return True
+        was_final, fetched_at = self.loaded[session_key]
+        # a session that was not final( or had no drivers yet) when it was downloaded is asked again, not more often than DEFAULT_MAX_AGE
+        return not was_final and time.time() - fetched_at > DEFAULT_MAX_AGE
+
+    def update(self, year, sessions, final_keys):
+        """
+        Make sure the drivers of these sessions( session dicts from /sessions) are in the registry, downloading the missing ones
+        final_keys are the sessions whose data can't change anymore
+        If the api fails the registry keeps what it had, names are not worth failing a refresh for
+        """
+        with self.lock:
+            if not self.read_from_disk:
+                self._read()
+                self.read_from_disk = True
+            missing = [s for s in sessions if self._needs_fetch(s['session_key'])]
+            if missing:
+                self._read([s['session_key'] for s in missing])
+                missing = [s for s in missing if self._needs_fetch(s['session_key'])]
+            if not missing:
+                return
+
+            print(f"Downloading the drivers of {len(missing)} sessions")
+            try:
+                records = fetch_drivers([s['session_key'] for s in missing])
+            except requests.exceptions.RequestException as e:
+                print(f"Could not download the drivers: {e}")
+                return
+
+            now = time.time()
+            rows = []
+            for session in missing:
+                session_key = session['session_key']
+                for record in records.get(session_key, []):
+                    rows.append((session_key, record['driver_number'], year, session.get('date_start'),
+                                 record.get('name_acronym'), record.get('team_name'), record.get('team_colour')))
+            with self._connect() as conn:
+                conn.executemany('INSERT OR REPLACE INTO drivers VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+                conn.executemany('INSERT OR REPLACE INTO loaded_sessions VALUES (?, ?, ?, ?)',
+                                 [(s['session_key'], year, int(s['session_key'] in final_keys and s['session_key'] in records), now) for s in missing])
+            for row in rows:
+                self._remember(*row)
+            for session in missing:
+                # a session with no drivers yet counts as not final, it is asked again later
+                self.loaded[session['session_key']] = (session['session_key'] in final_keys and session['session_key'] in records, now)
+
+    def lookup(self, session_key, driver_number):
+        """
+        (name_acronym, team_name, team_colour) of a driver in a session, None if unknown
+        """
+        return self.by_session.get(session_key, {}).get(driver_number)
+
+    def lookup_year(self, year, driver_number):
+        """
+        (name_acronym, team_name, team_colour) of a driver in the latest session of the year that has them, None if unknown
+        """
+        known = self.by_year.get((year, driver_number))
+        return None if known is None else known[1:]
+
+
+def fetch_drivers(session_keys):
+    """
+    /drivers of many sessions with one request over the range of their keys( other sessions in the range are dropped),
+    then one request per session for any that the range did not cover
+    Returns {session_key: [driver records]}
+    """
+    wanted = set(session_keys)
+    records = {}
+    for record in fetch_json('drivers', {'session_key>=': min(wanted), 'session_key<=': max(wanted)}):
+        if record.get('session_key') in wanted and record.get('driver_number') is not None:
+            records.setdefault(record['session_key'], []).append(record)
+    for session_key in sorted(wanted - set(records)):
+        found = [r for r in fetch_json('drivers', {'session_key': session_key}) if r.get('driver_number') is not None]
+        if found:
+            records[session_key] = found
+    return records
+
+
+REGISTRY = DriverRegistry()
@@ -1,37 +1,800 @@
+import datetime
+import fcntl
+import gzip
+import hashlib
+import io
+import json
 import os
+import socket
+import threading
 import time
-from flask import Flask, send_file
-from plotGenerator import generate_plots
+from contextlib import contextmanager
+from flask import Flask, abort, jsonify, request, send_file
+from artifactStore import StoreError, open_store, load_blob, publish_season_artifacts, fetch_season_artifacts
+from lruCache import ByteLRU
+from metrics import METRICS, collect, prometheus_text, profile_requested, run_profiled
+from renderPool import RENDER_POOL
+# only light modules up here: numpy, matplotlib and requests come with plotGenerator/refreshPolicy, which are imported
+# by the background refresher when it actually needs them, so a worker( re)starts in a fraction of a second
+from plotRenderer import ARTIFACT_VARIANTS, RASTER_WIDTHS, DEFAULT_WIDTH
+from seasonArtifacts import FIRST_SEASON, SEASONS_DIR, PLOTS, current_variants, season_variant_path, season_data_path, load_season_manifest, season_is_complete, publish_season, publish_file
 
 app = Flask(__name__)
-CACHE_TIMEOUT = 3600  # 1 hour
+SCHEDULER_INTERVAL = 30  # seconds between two looks of the background refresher at the refresh state
+# the check against the api scheduled by refreshPolicy can be this late before /health complains
+STALENESS_GRACE = SCHEDULER_INTERVAL + 600
 PLOT1_PATH = 'static/plot1.png'
 PLOT2_PATH = 'static/plot2.png'
+# every variant of a plot is its default png path with the suffix of the variant instead of .png
+PLOT_PATHS = {'plot1': PLOT1_PATH, 'plot2': PLOT2_PATH}
+# the current season as json( /season.json), written with the plots
+SEASON_DATA_PATH = 'static/data.json'
+MIMETYPES = {'png': 'image/png', 'webp': 'image/webp', 'svg': 'image/svg+xml'}
+# past seasons( ?year=) are rendered once, on the first request for them( or by seasonBackfill.py), and kept for good
+# in static/seasons/YEAR/, see seasonArtifacts.py; they can't change anymore, browsers can keep them for a while
+PAST_SEASON_MAX_AGE = 7 * 24 * 3600
+# a past season rendered while some of its results were missing or provisional is served with this instead, and rendered
+# again( see refresh_backoff) until it is complete
+UNPINNED_SEASON_MAX_AGE = 600
+# held by the worker that is regenerating the plots, shared by all gunicorn workers through the filesystem
+REGENERATION_LOCK_PATH = 'static/.regeneration.lock'
+# fingerprint of the data behind the plots and time of the next check, shared by all gunicorn workers
+REFRESH_STATE_PATH = 'static/refresh_state.json'
+# live mode( see liveSession.py): the worker holding the lock polls the api and writes the state, every worker watches it
+LIVE_STATE_PATH = 'static/live_state.json'
+LIVE_LOCK_PATH = 'static/.live.lock'
+LIVE_WATCH_INTERVAL = 0.25  # seconds between two looks of a worker at the live state file
+LIVE_HEARTBEAT = 15  # seconds without news after which a /live stream gets a comment, so nothing in between closes it
+LIVE_STREAM_MAX_SECONDS = 600  # a /live stream ends after this, the browser reconnects by itself
+LIVE_RETRY_MS = 2000  # how long the browser waits before reconnecting
+# every open /live stream holds a thread of the worker( threads in gunicorn.conf.py), the rest are kept for the plots
+LIVE_MAX_STREAMS = 12
+# plots, season json and live state shared with the other workers and hosts through the artifact store( see
+# artifactStore.py): the worker holding the producer lease asks the api and renders, every other one copies from the store
+STORE = open_store()
+PRODUCER_LEASE = 'producer'
+# longer than the slowest regeneration( a cold start downloads the whole season), renewed at every look of the refresher
+PRODUCER_LEASE_TTL = 600
+STORE_SYNC_INTERVAL = 10  # seconds between two looks of a replica at the pointers of the store
+REFRESH_STATE_POINTER = 'state/refresh'
+# past seasons asked to replicas that the store doesn't have yet, for the producer to render
+WANTED_SEASONS_POINTER = 'state/wanted_seasons'
+LIVE_LEASE = 'live'
+LIVE_LEASE_TTL = 180  # the poller looks at least every LIVE_IDLE_INTERVAL( 60 s) and renews it
+LIVE_STATE_POINTER = 'live/state'
+LIVE_MIRROR_INTERVAL = 1  # seconds between two looks at the live state in the store, on the hosts that don't poll
 
-def plots_expired():
-    if not os.path.exists(PLOT1_PATH) or not os.path.exists(PLOT2_PATH):
-        return True
+def plots_exist():
+    return os.path.exists(PLOT1_PATH) and os.path.exists(PLOT2_PATH)
+
+# state of the background refresher of this worker
+scheduler_state = {'thread': None, 'last_attempt': None, 'last_success': None, 'last_error': None}
+scheduler_wakeup = threading.Event()
+# a season whose refresh failed( probe, download or render) waits this long before the next try, doubled at every failure
+# in a row up to the longest interval of the refresh policy( IDLE_POLL_INTERVAL), and is back to normal after a success
+RETRY_BACKOFF_BASE = SCHEDULER_INTERVAL
+# year -> (failures in a row, time before which it is not tried again)
+refresh_backoff = {}
+# past seasons asked for that aren't on disk yet, rendered by the background refresher
+requested_seasons = set()
+# past seasons known to be on disk with every variant, they never go away
+pinned_seasons = set()
+# files of the past seasons being served, read from disk once: path -> (data, etag, mtime), at most this many bytes per worker
+PINNED_ARTIFACT_CACHE = ByteLRU(32 * 2**20)
+# season json documents, read and compressed once per change of the file: path -> (mtime_ns, data, gzipped data, etag)
+season_data_cache = {}
+# last live state published by the poller( whichever worker it is), as this worker read it, and the event sent for it
+live_state = {'mtime': None, 'seq': None, 'data': None, 'event': None}
+# notified when live_state changes, the /live streams wait on it
+live_changed = threading.Condition()
+live_threads = {'watcher': None, 'poller': None, 'streams': 0}
+# what this worker is for the artifact store
+store_state = {'role': None, 'last_sync': None, 'last_error': None}
+
+def plots_age():
+    """
+    Seconds since the plots being served were rendered, None if there are none yet
+    """
+    if not plots_exist():
+        return None
     last_modified = min(os.path.getmtime(PLOT1_PATH), os.path.getmtime(PLOT2_PATH))
-    return (time.time() - last_modified) > CACHE_TIMEOUT
+    return time.time() - last_modified
+
+def load_refresh_state():
+    try:
+        with open(REFRESH_STATE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def check_due():
+    """
+    True if the plots are missing or the check scheduled by the refresh policy is due
+    """
+    if not plots_exist() or profile_requested():
+        return True
+    return time.time() >= load_refresh_state().get('next_check', 0)
+
+# content hash of each plot file, recomputed only when the file changes: path -> (mtime_ns, size, etag)
+etag_cache = {}
+
+def file_etag(path):
+    """
+    Strong ETag from the content of the file, so every worker( and every restart) gives the same one for the same image
+    """
+    stat = os.stat(path)
+    cached = etag_cache.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    with open(path, 'rb') as f:
+        etag = hashlib.sha256(f.read()).hexdigest()[:32]
+    etag_cache[path] = (stat.st_mtime_ns, stat.st_size, etag)
+    return etag
+
+def seconds_until_next_check():
+    """
+    The plots can't change before the next scheduled check, browsers can keep them until then without asking
+    """
+    return max(0, int(load_refresh_state().get('next_check', 0) - time.time()))
+
+def variant_path(plot, suffix, year=None):
+    """
+    File of a variant of a plot, of the current season( year None) or of a past one
+    """
+    if year is None:
+        return PLOT_PATHS[plot][:-len('.png')] + suffix
+    return season_variant_path(plot, suffix, year)
+
+def is_pinned(year):
+    if year in pinned_seasons:
+        return True
+    # rendered with another set of variants( or not at all), render it again; rendered from a season that wasn't
+    # complete, served but rendered again
+    manifest = load_season_manifest(year)
+    if not season_is_complete(manifest) or not manifest.get('final'):
+        return False
+    pinned_seasons.add(year)
+    return True
+
+def pinned_artifact(path):
+    """
+    (data, etag, mtime) of a file of a pinned season, from memory after the first time
+    """
+    artifact = PINNED_ARTIFACT_CACHE.get(path)
+    if artifact is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+        artifact = (data, hashlib.sha256(data).hexdigest()[:32], os.path.getmtime(path))
+        PINNED_ARTIFACT_CACHE.put(path, artifact, len(data))
+    return artifact
+
+def explicitly_accepts(mimetype):
+    # */* and image/* don't count, a client that only says that( curl, old browsers) gets a png
+    return any(value == mimetype and quality > 0 for value, quality in request.accept_mimetypes)
+
+def choose_variant(plot, year=None):
+    """
+    The smallest file the client can use, as (path, format, content encoding)
+    ?format=png|webp|svg forces the format, ?w= is the pixel width wanted( the smallest bitmap at least that wide is used,
+    the svg fits any width), otherwise the Accept and Accept-Encoding headers decide and png at DEFAULT_WIDTH is the fallback
+    """
+    wanted_format = request.args.get('format')
+    wanted_width = request.args.get('w', type=int) or DEFAULT_WIDTH
+    width = min((w for w in RASTER_WIDTHS if w >= wanted_width), default=max(RASTER_WIDTHS))
+
+    candidates = []
+    for suffix, fmt, variant_width, encoding in ARTIFACT_VARIANTS:
+        if variant_width is not None and variant_width != width:
+            continue
+        if wanted_format in MIMETYPES:
+            if fmt != wanted_format:
+                continue
+        elif fmt != 'png' and not explicitly_accepts(MIMETYPES[fmt]):
+            continue
+        if encoding is not None and not request.accept_encodings[encoding]:
+            continue
+        path = variant_path(plot, suffix, year)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            # not rendered yet( e.g. plots from before the variants existed), the next regeneration makes it
+            continue
+        candidates.append((size, path, fmt, encoding))
+
+    if not candidates:
+        return variant_path(plot, '.png', year), 'png', None
+    _, path, fmt, encoding = min(candidates)
+    return path, fmt, encoding
+
+def plots_being_generated():
+    response = app.response_class('Plots are being generated, retry in a few seconds', status=503, mimetype='text/plain')
+    response.headers['Retry-After'] = str(SCHEDULER_INTERVAL)
+    return response
+
+def variant_response(response, encoding):
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    # the same url gives different files depending on these, caches must keep them apart
+    response.vary.update(['Accept', 'Accept-Encoding'])
+    return response
+
+def requested_year():
+    """
+    The past season asked for with ?year=, None for the current one, raises NotFound for seasons there is no data of
+    """
+    year = request.args.get('year', type=int)
+    current_year = datetime.date.today().year
+    if year is None or year == current_year:
+        return None
+    if not FIRST_SEASON <= year < current_year:
+        abort(404, f'No data for {year}, seasons go from {FIRST_SEASON} to {current_year}')
+    return year
+
+def serve_plot(plot):
+    """
+    Always answer with the last good render, requests never wait for a regeneration
+    Conditional requests( If-None-Match/If-Modified-Since) that still match get a 304 with no body
+    ?year= picks a past season, see serve_past_plot
+    """
+    year = requested_year()
+    if year is not None:
+        return serve_past_plot(plot, year)
+
+    age = plots_age()
+    if age is None:
+        # very first start, the background refresher is on it
+        scheduler_wakeup.set()
+        return plots_being_generated()
+    if check_due():
+        scheduler_wakeup.set()
+    path, fmt, encoding = choose_variant(plot)
+    # flask would take a relative path as relative to this file, static/ is where the server runs
+    response = send_file(os.path.abspath(path), mimetype=MIMETYPES[fmt], conditional=True, etag=file_etag(path), max_age=seconds_until_next_check(),
+                         download_name=f'{plot}.{fmt}')
+    response.headers['X-Plot-Age'] = str(int(age))
+    return variant_response(response, encoding)
+
+def serve_past_plot(plot, year):
+    """
+    A season that is over never changes: it is rendered once in the background( the first request gets a 503 like on
+    the very first start), then served from disk and from the memory of the worker, never asking the api again
+    """
+    if not is_pinned(year):
+        requested_seasons.add(year)
+        scheduler_wakeup.set()
+        if not season_is_complete(load_season_manifest(year)):
+            return plots_being_generated()
+        # on disk but not final, from the file like the current season( the memory cache is for files that never change)
+        path, fmt, encoding = choose_variant(plot, year)
+        response = send_file(os.path.abspath(path), mimetype=MIMETYPES[fmt], conditional=True, etag=file_etag(path),
+                             max_age=UNPINNED_SEASON_MAX_AGE, download_name=f'{plot}-{year}.{fmt}')
+        return variant_response(response, encoding)
+    path, fmt, encoding = choose_variant(plot, year)
+    data, etag, mtime = pinned_artifact(path)
+    response = send_file(io.BytesIO(data), mimetype=MIMETYPES[fmt], conditional=True, etag=etag, last_modified=mtime,
+                         max_age=PAST_SEASON_MAX_AGE, download_name=f'{plot}-{year}.{fmt}')
+    return variant_response(response, encoding)
+
+def load_season_data(path):
+    """
+    (data, gzipped data, etag, mtime) of a season json, from memory unless the file changed since it was read
+    """
+    stat = os.stat(path)
+    cached = season_data_cache.get(path)
+    if cached is None or cached[0] != stat.st_mtime_ns:
+        with open(path, 'rb') as f:
+            data = f.read()
+        cached = (stat.st_mtime_ns, data, gzip.compress(data, compresslevel=9, mtime=0), hashlib.sha256(data).hexdigest()[:32])
+        season_data_cache[path] = cached
+    return cached[1], cached[2], cached[3], stat.st_mtime
+
+@app.route('/season.json')
+def serve_season_data():
+    """
+    Standings, cumulative history, session names and team colors as columnar json( see season_document in plotGenerator.py),
+    for pages that draw the charts themselves; generated with the plots, served from memory, ?year= like the plots
+    """
+    year = requested_year()
+    if year is None:
+        path = SEASON_DATA_PATH
+        max_age = seconds_until_next_check()
+        if check_due():
+            scheduler_wakeup.set()
+    else:
+        path = season_data_path(year)
+        max_age = PAST_SEASON_MAX_AGE
+        if not is_pinned(year):
+            requested_seasons.add(year)
+            scheduler_wakeup.set()
+            if not season_is_complete(load_season_manifest(year)):
+                return plots_being_generated()
+            max_age = UNPINNED_SEASON_MAX_AGE
+    try:
+        data, gzipped, etag, mtime = load_season_data(path)
+    except OSError:
+        # plots from before the json existed, or the very first start
+        scheduler_wakeup.set()
+        return plots_being_generated()
+
+    if request.accept_encodings['gzip']:
+        response = app.response_class(gzipped, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = app.response_class(data, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.last_modified = mtime
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    # the page that uses it is not served by this server
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response.make_conditional(request)
+
+def read_live_state():
+    """
+    Read the live state file again if it changed since the last time, and wake up the /live streams
+    """
+    try:
+        stat = os.stat(LIVE_STATE_PATH)
+        if stat.st_mtime_ns == live_state['mtime']:
+            return
+        with open(LIVE_STATE_PATH, 'rb') as f:
+            data = f.read()
+        seq = json.loads(data)['seq']
+    except (OSError, ValueError, KeyError):
+        return
+    with live_changed:
+        live_state.update(mtime=stat.st_mtime_ns, seq=seq, data=data, event=b'id: %d\nevent: live\ndata: %s\n\n' % (seq, data))
+        live_changed.notify_all()
+
+@app.route('/live')
+def live_stream():
+    """
+    Server-sent events: the live state( running order and projected standings, see liveSession.py) every time the poller
+    publishes a new one, with its seq as event id; a browser that reconnects( EventSource does it by itself) with
+    Last-Event-ID doesn't get again what it already has
+    """
+    # the slot is taken right here, under the lock, so connections arriving together can't all get past the limit
+    with live_changed:
+        full = live_threads['streams'] >= LIVE_MAX_STREAMS
+        if not full:
+            live_threads['streams'] += 1
+    if full:
+        response = app.response_class('Too many live viewers, retry in a few seconds', status=503, mimetype='text/plain')
+        response.headers['Retry-After'] = str(LIVE_RETRY_MS // 1000)
+        return response
+    METRICS.inc('live_streams_total')
+    last_seen = request.headers.get('Last-Event-ID', type=int)
+
+    def events():
+        yield b'retry: %d\n\n' % LIVE_RETRY_MS
+        seen = last_seen
+        end = time.time() + LIVE_STREAM_MAX_SECONDS
+        while time.time() < end:
+            with live_changed:
+                if live_state['seq'] is None or live_state['seq'] == seen:
+                    live_changed.wait(LIVE_HEARTBEAT)
+                seq, event = live_state['seq'], live_state['event']
+            if seq is not None and seq != seen:
+                seen = seq
+                yield event
+            else:
+                yield b': keep-alive\n\n'
+
+    def release_stream():
+        with live_changed:
+            live_threads['streams'] -= 1
+
+    response = app.response_class(events(), mimetype='text/event-stream')
+    # called when the server is done with the response, even if the stream never started( client gone right away)
+    response.call_on_close(release_stream)
+    response.headers['Cache-Control'] = 'no-cache'
+    # nothing in between should buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+@app.route('/live.json')
+def live_snapshot():
+    """
+    The last live state as plain json, for whatever can't keep a connection open
+    """
+    data = live_state['data'] or b'{"live":false}'
+    response = app.response_class(data, mimetype='application/json')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
 
 @app.route('/plot1.png')
 def serve_plot1():
-    if plots_expired():
-        generate_plots_to_disk()
-    return send_file(PLOT1_PATH, mimetype='image/png')
+    return serve_plot('plot1')
 
 @app.route('/plot2.png')
 def serve_plot2():
-    if plots_expired():
-        generate_plots_to_disk()
-    return send_file(PLOT2_PATH, mimetype='image/png')
+    return serve_plot('plot2')
 
-def generate_plots_to_disk():
-    buf1, buf2 = generate_plots()
-    with open(PLOT1_PATH, 'wb') as f:
-        f.write(buf1.read())
-    with open(PLOT2_PATH, 'wb') as f:
-        f.write(buf2.read())
+@app.route('/health')
+def health():
+    age = plots_age()
+    refresh_state = load_refresh_state()
+    # the plots are as fresh as the last check said they were, as long as the checks happen on schedule
+    healthy = age is not None and time.time() <= refresh_state.get('next_check', 0) + STALENESS_GRACE
+    return jsonify({
+        'healthy': healthy,
+        'plot_age_seconds': None if age is None else int(age),
+        'last_check': refresh_state.get('last_check'),
+        'next_check': refresh_state.get('next_check'),
+        'next_check_reason': refresh_state.get('reason'),
+        'last_refresh_attempt': scheduler_state['last_attempt'],
+        'last_refresh_success': scheduler_state['last_success'],
+        'last_refresh_error': scheduler_state['last_error'],
+        'refresh_backoff': {year: {'failures': failures, 'next_try': next_try} for year, (failures, next_try) in refresh_backoff.items()},
+        'render_pool': RENDER_POOL.stats,
+        'artifact_store': dict(store_state, backend=STORE.backend),
+    }), 200 if healthy else 503
+
+@app.route('/metrics')
+def metrics():
+    """
+    Prometheus text format: stage timings, upstream requests/bytes, cache lookups and regenerations of all the workers
+    ( the others' numbers are as old as their last look at the refresh state, SCHEDULER_INTERVAL at most)
+    """
+    METRICS.dump()
+    gauges = {'plot_age_seconds': plots_age(), 'seconds_until_next_check': seconds_until_next_check()}
+    return app.response_class(prometheus_text(collect(), gauges), mimetype='text/plain; version=0.0.4')
+
+@contextmanager
+def regeneration_lock():
+    """
+    Gives True if this worker( or thread) got the regeneration lock, False if another one is holding it
+    """
+    os.makedirs(os.path.dirname(REGENERATION_LOCK_PATH), exist_ok=True)
+    with open(REGENERATION_LOCK_PATH, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def refresh_plots_single_flight():
+    """
+    Check the api for changes and regenerate the plots if there are any, in exactly one worker( or thread) at a time,
+    if another one is already at it this one just skips
+    Returns True if this call did the check
+    """
+    with regeneration_lock() as acquired:
+        # someone else may have done the check just before we got the lock
+        if not acquired or not check_due():
+            return False
+        if profile_requested():
+            run_profiled('regeneration', check_and_regenerate, True)
+        else:
+            check_and_regenerate()
+        return True
+
+def render_requested_seasons():
+    """
+    Render and pin the past seasons requests asked for, one worker at a time like the current season
+    """
+    for year in sorted(requested_seasons):
+        if not retry_allowed(year):
+            # failed not long ago, it stays asked for until its next try
+            continue
+        with regeneration_lock() as acquired:
+            if not acquired:
+                # try again at the next round, maybe the other worker is doing this very season
+                return
+            requested_seasons.discard(year)
+            if is_pinned(year):
+                continue
+            print(f"Rendering the {year} season")
+            try:
+                if pin_season(year):
+                    record_refresh_success(year)
+                else:
+                    # served as it is for now, asked for again after the backoff
+                    print(f"The {year} season is not complete yet, not pinned")
+                    record_refresh_failure(year)
+            except Exception as e:
+                # the next request for it asks again
+                METRICS.inc('regenerations_total', season='past', outcome='failed')
+                scheduler_state['last_error'] = str(e)
+                print(f"Rendering the {year} season failed: {e}")
+                record_refresh_failure(year)
+
+def retry_allowed(year):
+    return time.time() >= refresh_backoff.get(year, (0, 0))[1]
+
+def record_refresh_failure(year):
+    # the refresh that failed already imported it
+    from refreshPolicy import IDLE_POLL_INTERVAL
+    failures = refresh_backoff.get(year, (0, 0))[0] + 1
+    delay = min(RETRY_BACKOFF_BASE * 2 ** (failures - 1), IDLE_POLL_INTERVAL)
+    refresh_backoff[year] = (failures, time.time() + delay)
+    print(f"{year}: {failures} failed refreshes in a row, next try in {delay} s")
+
+def record_refresh_success(year):
+    refresh_backoff.pop(year, None)
+
+def refresh_loop():
+    """
+    Background refresher, looks every SCHEDULER_INTERVAL seconds( or as soon as a request finds a check due)
+    if the refresh policy wants a check, and does it
+    That's on the producer, a replica copies what the producer published every STORE_SYNC_INTERVAL seconds instead
+    """
+    while True:
+        if holds_lease(PRODUCER_LEASE, PRODUCER_LEASE_TTL):
+            store_state['role'] = 'producer'
+            year = datetime.date.today().year
+            if check_due() and retry_allowed(year):
+                scheduler_state['last_attempt'] = time.time()
+                try:
+                    if refresh_plots_single_flight():
+                        scheduler_state['last_success'] = time.time()
+                        scheduler_state['last_error'] = None
+                        record_refresh_success(year)
+                except Exception as e:
+                    METRICS.inc('regenerations_total', season='current', outcome='failed')
+                    scheduler_state['last_error'] = str(e)
+                    print(f"Background refresh failed: {e}")
+                    record_refresh_failure(year)
+            publish_missing_to_store()
+            if requested_seasons:
+                render_requested_seasons()
+        else:
+            store_state['role'] = 'replica'
+            sync_from_store()
+        try:
+            # for /metrics of the other workers
+            METRICS.dump()
+        except OSError as e:
+            # the refresher goes on, /metrics of the others is one look older
+            print(f"Could not write the metrics: {e}")
+        if store_state['role'] == 'replica':
+            # requests don't make a replica look at the store more often, the producer decides when things change
+            time.sleep(STORE_SYNC_INTERVAL)
+        else:
+            scheduler_wakeup.wait(SCHEDULER_INTERVAL)
+        scheduler_wakeup.clear()
+
+def store_owner():
+    # after the fork, the pid is the worker's
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def holds_lease(name, ttl):
+    """
+    True if this worker has the lease( renewed) or just got it; if the store can't be reached every host goes on on its
+    own, like before there was a store
+    """
+    try:
+        return STORE.acquire_lease(name, store_owner(), ttl)
+    except (StoreError, OSError) as e:
+        store_state['last_error'] = f'{name} lease: {e}'
+        return True
+
+def push_to_store(what, function, *args):
+    """
+    function(*args), something that writes to the store; if it fails this worker still serves its own files and the
+    replicas the previous ones, publish_missing_to_store tries again
+    """
+    try:
+        function(*args)
+    except (StoreError, OSError) as e:
+        store_state['last_error'] = f'pushing {what}: {e}'
+        print(f"Could not push {what} to the artifact store: {e}")
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def push_season_from_disk(year):
+    """
+    Publish to the store the files of a season this worker has on disk( the current one, or a pinned past one)
+    """
+    current = year == datetime.date.today().year
+    plot_year = None if current else year
+    suffixes = [suffix for suffix in current_variants() if all(os.path.exists(variant_path(plot, suffix, plot_year)) for plot in PLOTS)]
+    artifacts = tuple({suffix: read_file(variant_path(plot, suffix, plot_year)) for suffix in suffixes} for plot in PLOTS)
+    season_data = read_file(SEASON_DATA_PATH if current else season_data_path(year))
+    inputs = None if current else (load_season_manifest(year) or {}).get('inputs')
+    publish_season_artifacts(STORE, year, artifacts, season_data, inputs)
+    if current:
+        STORE.set_pointer(REFRESH_STATE_POINTER, load_refresh_state())
+
+def publish_missing_to_store():
+    """
+    On the producer: the current season again if the store doesn't have what is on disk( first start with a store, a
+    push that failed), and the past seasons replicas asked for, pushed from disk or queued for rendering
+    """
+    year = datetime.date.today().year
+    try:
+        record = STORE.get_pointer(f'{year}/.png')
+        if plots_exist() and os.path.exists(SEASON_DATA_PATH) and (record is None or record['digests']['plot1'][:32] != file_etag(PLOT1_PATH)):
+            push_season_from_disk(year)
+        wanted = STORE.get_pointer(WANTED_SEASONS_POINTER)
+        if wanted and wanted.get('years'):
+            for past_year in wanted['years']:
+                if is_pinned(past_year):
+                    push_season_from_disk(past_year)
+                else:
+                    requested_seasons.add(past_year)
+            # a season whose render fails is asked for again by the replica at its next sync
+            STORE.set_pointer(WANTED_SEASONS_POINTER, {'years': []})
+    except (StoreError, OSError, KeyError) as e:
+        store_state['last_error'] = str(e)
+        print(f"Could not publish to the artifact store: {e}")
+
+def sync_file(path, digest):
+    """
+    Copy a blob of the store to path unless the file already has those bytes, returns 1 if it copied
+    """
+    if os.path.exists(path) and file_etag(path) == digest[:32]:
+        return 0
+    publish_file(path, load_blob(STORE, digest))
+    return 1
+
+def sync_from_store():
+    """
+    On a replica: copy the current season the pointers name( variants, default png last, the json and the refresh state)
+    to static/, and the past seasons asked for here if the store has them, asking the producer for the others
+    """
+    year = datetime.date.today().year
+    try:
+        copied = 0
+        for suffix in sorted(current_variants(), key=lambda suffix: suffix == '.png'):
+            record = STORE.get_pointer(f'{year}/{suffix}')
+            for plot, digest in (record or {}).get('digests', {}).items():
+                copied += sync_file(variant_path(plot, suffix), digest)
+        record = STORE.get_pointer(f'{year}/json')
+        if record is not None:
+            copied += sync_file(SEASON_DATA_PATH, record['digests']['season'])
+        state = STORE.get_pointer(REFRESH_STATE_POINTER)
+        if state is not None and state != load_refresh_state():
+            publish_file(REFRESH_STATE_PATH, json.dumps(state).encode())
+
+        missing = []
+        for past_year in sorted(requested_seasons):
+            season = fetch_season_artifacts(STORE, past_year, current_variants())
+            if season is None:
+                missing.append(past_year)
+                continue
+            publish_season(past_year, *season)
+            requested_seasons.discard(past_year)
+            copied += 1
+        if missing:
+            wanted = STORE.get_pointer(WANTED_SEASONS_POINTER) or {'years': []}
+            if not set(missing) <= set(wanted['years']):
+                STORE.set_pointer(WANTED_SEASONS_POINTER, {'years': sorted(set(wanted['years']) | set(missing))})
+        METRICS.inc('artifact_store_copies_total', copied)
+        store_state['last_sync'] = time.time()
+        store_state['last_error'] = None
+    except (StoreError, OSError, KeyError) as e:
+        store_state['last_error'] = str(e)
+        print(f"Sync from the artifact store failed: {e}")
+
+def start_refresh_scheduler():
+    """
+    Start the background refresher of this worker( once), every gunicorn worker has its own but the lock lets only one regenerate
+    """
+    if scheduler_state['thread'] is None or not scheduler_state['thread'].is_alive():
+        scheduler_state['thread'] = threading.Thread(target=refresh_loop, name='plot-refresher', daemon=True)
+        scheduler_state['thread'].start()
+
+def live_watcher():
+    while True:
+        read_live_state()
+        time.sleep(LIVE_WATCH_INTERVAL)
+
+def live_poller():
+    """
+    Wait for the live lock and then follow the sessions for good: the first worker to get there does it, the others stay
+    blocked here until it exits( the lock goes with the process) and one of them takes over
+    Of all the hosts only the one with the live lease of the store asks the api, the others copy its state from the store
+    """
+    os.makedirs(os.path.dirname(LIVE_LOCK_PATH), exist_ok=True)
+    with open(LIVE_LOCK_PATH, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        print(f"Worker {os.getpid()} follows the live sessions")
+        poller = None
+        while True:
+            if holds_lease(LIVE_LEASE, LIVE_LEASE_TTL):
+                if poller is None:
+                    from liveSession import LivePoller
+                    poller = LivePoller(LIVE_STATE_PATH, published=lambda state: push_to_store('the live state', STORE.set_pointer, LIVE_STATE_POINTER, state))
+                interval = poller.step()
+            else:
+                mirror_live_state()
+                interval = LIVE_MIRROR_INTERVAL
+            time.sleep(interval)
+
+def mirror_live_state():
+    try:
+        state = STORE.get_pointer(LIVE_STATE_POINTER)
+    except (StoreError, OSError) as e:
+        store_state['last_error'] = f'live state: {e}'
+        return
+    if state is not None and state.get('seq') != live_state['seq']:
+        publish_file(LIVE_STATE_PATH, json.dumps(state, separators=(',', ':')).encode())
+
+def start_live_threads():
+    """
+    Start the live state watcher and the candidate live poller of this worker( once), like start_refresh_scheduler
+    """
+    for name, target in (('watcher', live_watcher), ('poller', live_poller)):
+        if live_threads[name] is None or not live_threads[name].is_alive():
+            live_threads[name] = threading.Thread(target=target, name=f'live-{name}', daemon=True)
+            live_threads[name].start()
+
+def check_and_regenerate(force=False):
+    """
+    Probe the api( session list and unfinished sessions only), regenerate the plots only if that changed( or force),
+    then schedule the next check according to the race calendar
+    If anything fails( e.g. the api is down) the previous plots simply keep being served
+    """
+    from refreshPolicy import probe_season, next_check_time
+    state = load_refresh_state()
+    year = datetime.date.today().year
+    with METRICS.timer('probe'):
+        probe = probe_season(year)
+
+    variants = current_variants()
+    # a different set of variants( first start with them, brotli installed or removed) needs a render too
+    if force or not plots_exist() or not os.path.exists(SEASON_DATA_PATH) or probe['fingerprint'] != state.get('fingerprint') or state.get('year') != year or state.get('variants') != variants:
+        print("Season data changed, regenerating plots")
+        with METRICS.timer('regeneration'):
+            generate_plots_to_disk(year)
+        state['fingerprint'] = probe['fingerprint']
+        state['year'] = year
+        state['variants'] = variants
+        state['last_render'] = time.time()
+        METRICS.inc('regenerations_total', season='current', outcome='rendered')
+    else:
+        METRICS.inc('regenerations_total', season='current', outcome='unchanged')
+
+    state['last_check'] = time.time()
+    state['next_check'], state['reason'] = next_check_time(probe['race_sessions'], probe['with_results'], provisional=probe['provisional'])
+    publish_file(REFRESH_STATE_PATH, json.dumps(state).encode())
+    push_to_store('the refresh state', STORE.set_pointer, REFRESH_STATE_POINTER, state)
+
+def generate_plots_to_disk(year=None):
+    """
+    Render once and publish every variant of both plots and the season json, the default pngs last since their mtime is the age of the plots
+    """
+    from plotGenerator import plot_data, season_document
+    data = plot_data(year)
+    # drawn in a render process( see renderPool.py), this worker never imports matplotlib
+    rendered = RENDER_POOL.render(data)
+    document = season_document(data)
+    publish_file(SEASON_DATA_PATH, document)
+    for plot, artifacts in zip(PLOTS, rendered):
+        for suffix, data in sorted(artifacts.items(), key=lambda item: item[0] == '.png'):
+            publish_file(variant_path(plot, suffix), data)
+    push_to_store('the current season', publish_season_artifacts, STORE, year or datetime.date.today().year, rendered, document)
+    push_to_store('the garbage collection', STORE.collect_garbage)
+
+def pin_season(year):
+    """
+    Render a past season and pin it if its results are complete and final( see apiConnect.season_is_final), otherwise
+    it is only written to disk to be served for now; returns True if it was pinned
+    """
+    from plotGenerator import plot_data, inputs_fingerprint, season_document
+    from apiConnect import season_is_final
+    data = plot_data(year)
+    final = season_is_final(year)
+    rendered, document, inputs = RENDER_POOL.render(data), season_document(data), inputs_fingerprint(data)
+    publish_season(year, rendered, document, inputs=inputs, final=final)
+    if not final:
+        METRICS.inc('regenerations_total', season='past', outcome='incomplete')
+        return False
+    # only complete seasons go to the store, the replicas pin what they find there
+    push_to_store(f'the {year} season', publish_season_artifacts, STORE, year, rendered, document, inputs)
+    pinned_seasons.add(year)
+    METRICS.inc('regenerations_total', season='past', outcome='rendered')
+    return True
 
 
 @app.route('/')
@@ -41,12 +804,38 @@ def index():
         <head><title>F1 Season Plots</title></head>
         <body>
             <h1>Season Points Distribution</h1>
-            <img src="/plot1.png" alt="Plot 1">
+            <img src="/plot1.png" srcset="/plot1.png?w=600 600w, /plot1.png?w=1200 1200w, /plot1.png?w=2400 2400w" sizes="(max-width: 1200px) 100vw, 1200px" alt="Plot 1">
             <h1>Points History</h1>
-            <img src="/plot2.png" alt="Plot 2">
+            <img src="/plot2.png" srcset="/plot2.png?w=600 600w, /plot2.png?w=1200 1200w, /plot2.png?w=2400 2400w" sizes="(max-width: 1200px) 100vw, 1200px" alt="Plot 2">
         </body>
     </html>
     '''
 
+def warm_start():
+    """
+    Read what the previous run left on disk( plots, season json, pinned seasons) into the caches, so the first request after
+    a restart is answered right away; with gunicorn's preload this runs once in the master and the workers inherit it
+    """
+    for plot in PLOTS:
+        for suffix in current_variants():
+            if os.path.exists(variant_path(plot, suffix)):
+                file_etag(variant_path(plot, suffix))
+    if os.path.exists(SEASON_DATA_PATH):
+        load_season_data(SEASON_DATA_PATH)
+    if os.path.isdir(SEASONS_DIR):
+        for name in os.listdir(SEASONS_DIR):
+            if name.isdigit():
+                is_pinned(int(name))
+
+# render processes are spawned( renderPool.py), with python flaskServer.py they import this file again as __mp_main__
+# ( before multiprocessing.parent_process() is set): they only render, no warm start, store sync or threads of their own
+if __name__ != '__mp_main__':
+    warm_start()
+    # under gunicorn the refresher is started by post_fork( see gunicorn.conf.py) in every worker, a thread started here
+    # during the preload would only exist in the master
+    if os.environ.get('F1PLOTS_SCHEDULER') != 'post_fork':
+        start_refresh_scheduler()
+        start_live_threads()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
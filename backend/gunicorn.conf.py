@@ -0,0 +1,22 @@
+import os
+
+# gunicorn settings, startingServer.sh runs: gunicorn -c gunicorn.conf.py flaskServer:app
+# the number of workers comes from WEB_CONCURRENCY( gunicorn's default is 1)
+
+bind = '0.0.0.0:5000'
+
+# every browser following a session live keeps a /live stream open, and with it a thread( see LIVE_MAX_STREAMS in flaskServer.py)
+threads = 16
+
+# import the app once in the master and fork the workers from it: flaskServer imports only light modules and reads the
+# last plots from disk( warm_start), so a restart is serving again in well under a second and the workers share that memory
+preload_app = True
+
+# the refresher thread can't be started during the preload( threads don't survive the fork), post_fork starts it in every worker
+os.environ['F1PLOTS_SCHEDULER'] = 'post_fork'
+
+
+def post_fork(server, worker):
+    import flaskServer
+    flaskServer.start_refresh_scheduler()
+    flaskServer.start_live_threads()
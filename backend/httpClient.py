@@ -0,0 +1,246 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from jsonStream import iter_json_array
+from metrics import METRICS
+from rateLimiter import TokenBucket
+
+
+# OPENF1_BASE_URL points the whole thing somewhere else, e.g. at replayServer.py for benchmarks and load tests
+API_BASE_URL = os.environ.get('OPENF1_BASE_URL', "https://api.openf1.org/v1").rstrip('/')
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+POOL_SIZE = 10                          # keep-alive connections kept open to the api
+
+MAX_RETRIES = 4                         # retries after the first attempt
+BACKOFF_BASE = 0.5                      # seconds, doubled at every retry
+BACKOFF_MAX = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+CIRCUIT_FAILURE_THRESHOLD = 5           # consecutive failed requests( after their retries) that open the circuit
+CIRCUIT_COOLDOWN = 60                   # seconds the circuit stays open before a trial request is let through
+
+# OpenF1 rate limit, shared by all the threads of the process
+RATE_LIMIT = 3      # requests per second
+RATE_BURST = 3      # requests that can go out back to back
+RATE_LIMITER = TokenBucket(RATE_LIMIT, RATE_BURST)
+
+
+class UpstreamError(requests.exceptions.RequestException):
+    """
+    The api could not give an answer, even after retrying
+    """
+
+
+class CircuitOpenError(UpstreamError):
+    """
+    The request was not even tried because the api failed too many times in a row
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests for `cooldown` seconds after `threshold` consecutive failures,
+    then lets a single trial request through( half open) and closes again on its success
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    print(f"Circuit breaker open after {self.failures} failed requests, pausing for {self.cooldown}s")
+                self.opened_at = time.monotonic()
+
+
+CIRCUIT_BREAKER = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    The shared requests session, connections to the api are pooled and kept alive between requests
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+
+def configure_rate_limit(rate, burst=None):
+    """
+    Change the rate limit used for the requests to the api
+    """
+    RATE_LIMITER.configure(rate, burst if burst is not None else RATE_LIMITER.capacity)
+
+
+def build_query(params):
+    """
+    Query string for openf1, comparison filters( 'date>=', 'position<' ...) are written the way openf1 reads them, date>=VALUE
+    """
+    parts = []
+    for key, value in params.items():
+        if key.endswith(('<', '>', '<=', '>=')):
+            parts.append(f"{quote(key, safe='<>=')}{quote(str(value), safe=':')}")
+        else:
+            parts.append(urlencode({key: value}))
+    return '&'.join(parts)
+
+
+def retry_after_seconds(response):
+    """
+    Seconds asked by the Retry-After header( either a number or an http date), None if there is no usable header
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, response=None):
+    """
+    Jittered exponential backoff( full jitter), never shorter than what the api asked with Retry-After
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if response is not None:
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, BACKOFF_MAX))
+    return delay
+
+
+def get(endpoint, params=None, stream=False):
+    """
+    GET an openf1 endpoint, retrying timeouts, connection and other request errors, 429s and 5xx with backoff
+    Returns the response if it is a 200 or a 404( what openf1 answers when a query has no results),
+    raises UpstreamError otherwise
+    Filters go in the parameter name like in the openf1 docs, e.g. {'date>=': '2024-03-02T15:00:00'}
+    """
+    if not CIRCUIT_BREAKER.allow_request():
+        raise CircuitOpenError(f"/{endpoint} not requested, circuit breaker is open")
+
+    url = f"{API_BASE_URL}/{endpoint}"
+    if params:
+        url += '?' + build_query(params)
+    session = get_session()
+    last_error = None
+    # every request let through ends with a success or a failure for the breaker, whatever happens, otherwise a half-open
+    # trial that never ended would keep the breaker open for good
+    recorded = False
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            response = None
+            RATE_LIMITER.acquire()
+            try:
+                response = session.get(url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), stream=stream)
+            except requests.exceptions.RequestException as e:
+                # connection errors and timeouts, but also bodies cut short or badly encoded( ChunkedEncodingError...)
+                last_error = e
+                METRICS.inc('upstream_requests_total', endpoint=endpoint, status='error')
+            else:
+                METRICS.inc('upstream_requests_total', endpoint=endpoint, status=response.status_code)
+                if response.status_code in (200, 404):
+                    CIRCUIT_BREAKER.record_success()
+                    recorded = True
+                    return response
+                last_error = requests.exceptions.HTTPError(f"{response.status_code} from /{endpoint}", response=response)
+                if response.status_code not in RETRY_STATUSES:
+                    # our own request is wrong, retrying won't help and the api is not down
+                    CIRCUIT_BREAKER.record_success()
+                    recorded = True
+                    raise UpstreamError(f"/{endpoint} {params} failed: {last_error}")
+                response.close()
+
+            if attempt < MAX_RETRIES:
+                time.sleep(backoff_delay(attempt, response))
+
+        CIRCUIT_BREAKER.record_failure()
+        recorded = True
+        raise UpstreamError(f"/{endpoint} {params} failed after {MAX_RETRIES + 1} attempts: {last_error}")
+    finally:
+        if not recorded:
+            CIRCUIT_BREAKER.record_failure()
+
+
+def fetch_json(endpoint, params=None):
+    """
+    GET an openf1 endpoint and parse the json body, a query with no results gives an empty list
+    """
+    response = get(endpoint, params)
+    METRICS.inc('upstream_bytes_total', len(response.content), endpoint=endpoint)
+    if response.status_code == 404:
+        return []
+    try:
+        return response.json()
+    except ValueError as e:
+        raise UpstreamError(f"/{endpoint} {params} returned invalid json: {e}")
+
+
+def stream_json_array(endpoint, params=None):
+    """
+    GET an openf1 endpoint and yield the elements of the json array one by one while it downloads,
+    for the big endpoints( /position) whose whole body is not worth keeping in memory
+    """
+    response = get(endpoint, params, stream=True)
+    with response:
+        if response.status_code == 404:
+            return
+        def counted_chunks():
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                METRICS.inc('upstream_bytes_total', len(chunk), endpoint=endpoint)
+                yield chunk
+        try:
+            yield from iter_json_array(counted_chunks())
+        except ValueError as e:
+            raise UpstreamError(f"/{endpoint} {params} returned invalid json: {e}")
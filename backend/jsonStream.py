@@ -0,0 +1,49 @@
+import codecs
+import json
+import re
+
+
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json_array(chunks):
+    """
+    Parse a json array of objects incrementally from an iterable of byte chunks, yielding one element at a time
+    Only the element being parsed is kept in memory, never the whole document
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    started = False
+    finished = False
+
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        pos = 0
+        while True:
+            # skip whitespace and separators up to the next element
+            pos = SEPARATORS.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError(f"expected a json array, got {buffer[pos:pos + 40]!r}")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                finished = True
+                pos += 1
+                break
+            try:
+                element, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # element cut in half by the chunk boundary, wait for the rest
+                break
+            yield element
+        buffer = buffer[pos:]
+        if finished:
+            break
+
+    if not finished:
+        raise ValueError("json array ended unexpectedly")
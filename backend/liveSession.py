@@ -0,0 +1,220 @@
+"""
+Live mode: while a Race/Sprint is running the running order is followed from /position, asking every LIVE_POLL_INTERVAL
+only for the records newer than the newest one already seen( date>), and the championship standings are projected as if
+the session ended with that order
+
+One process( the one holding the live lock, and with more hosts the live lease of the artifact store, see flaskServer.py)
+polls and publishes the state to a json file, every gunicorn worker reads that file and pushes it to the browsers
+connected to /live, so the api sees one poller however many people are watching
+"""
+import datetime
+import json
+import time
+
+from apiCache import get_json, parse_date
+from httpClient import fetch_json
+from metrics import METRICS
+from refreshPolicy import race_sessions_of
+from seasonArtifacts import publish_file
+from seasonModel import RACE_POINTS, SPRINT_POINTS
+
+
+LIVE_POLL_INTERVAL = 4  # seconds between two requests to /position while a session is running
+LIVE_IDLE_INTERVAL = 60  # seconds between two looks at the session list when nothing is running
+# a session is followed from a bit before its start to a bit after its end( late starts, red flags)
+LIVE_LEAD = 5 * 60
+LIVE_TAIL = 30 * 60
+# the session list( the whole calendar, tens of kB) is only needed to know when a session starts and ends, it is asked
+# again at most this often by the poller; the refresher asks for it more often and its copy is in the same cache
+SESSIONS_MAX_AGE = 3600
+
+
+def find_live_session(race_sessions, now=None):
+    """
+    The Race/Sprint session running now( LIVE_LEAD/LIVE_TAIL around it), None if there is none
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    for session in race_sessions:
+        start = parse_date(session.get('date_start'))
+        end = parse_date(session.get('date_end'))
+        if start is None or end is None:
+            continue
+        if start - datetime.timedelta(seconds=LIVE_LEAD) <= now <= end + datetime.timedelta(seconds=LIVE_TAIL):
+            return session
+    return None
+
+
+def next_session(race_sessions, now=None):
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    upcoming = [s for s in race_sessions if parse_date(s.get('date_start')) is not None and parse_date(s['date_start']) > now]
+    return upcoming[0] if upcoming else None
+
+
+def session_label(session):
+    return f"{session.get('country_name', 'Unknown')} {session.get('session_name', '')}".strip()
+
+
+def base_standings(year, session_key):
+    """
+    Points of every driver before the live session( its partial results, if the /position fallback already put them in
+    the season, are left out), with names and colours, from the season get_all_season_results builds
+    """
+    from apiConnect import get_season_model
+    model, driver_names, _, driver_colors = get_season_model(year, incremental=True)
+    points = model.points_matrix()
+    keep = [column for column, key in enumerate(model.session_keys) if key != session_key]
+    totals = points[:, keep].sum(axis=1)
+    return {driver_num: int(totals[row]) for row, driver_num in enumerate(model.driver_numbers)}, driver_names, driver_colors
+
+
+class LiveSession:
+    """
+    Running order of one session, updated from the /position records newer than the last one seen
+    """
+
+    def __init__(self, session, base_points, driver_names, driver_colors):
+        self.session = session
+        self.session_key = session['session_key']
+        self.points_table = SPRINT_POINTS if session.get('session_name') == 'Sprint' else RACE_POINTS
+        self.base_points = base_points
+        self.driver_names = driver_names
+        self.driver_colors = driver_colors
+        self.order = {}  # driver_number -> [position, date of the record]
+        self.since = None  # date of the newest record seen
+
+    def apply(self, records):
+        """
+        Apply /position records( in any order), True if the running order changed
+        """
+        changed = False
+        for record in sorted(records, key=lambda r: r.get('date') or ''):
+            driver_number = record.get('driver_number')
+            position = record.get('position')
+            date = record.get('date')
+            if driver_number is None or position is None:
+                continue
+            if date is not None and (self.since is None or parse_date(date) > parse_date(self.since)):
+                self.since = date
+            current = self.order.get(driver_number)
+            if current is None or current[0] != position:
+                changed = True
+            self.order[driver_number] = [position, date]
+        return changed
+
+    def poll(self):
+        """
+        Ask only for the records newer than the newest one seen( date>=, like the /position fallback, would get the
+        whole starting grid again at every poll until the first overtake, it all has the same date)
+        """
+        params = {'session_key': self.session_key}
+        if self.since is not None:
+            params['date>'] = self.since
+        records = fetch_json('position', params)
+        METRICS.inc('live_records_total', len(records))
+        return self.apply(records)
+
+    def running_order(self):
+        return sorted(self.order, key=lambda d: self.order[d][0])
+
+    def snapshot(self):
+        """
+        The running order and the standings projected from it, as published to the browsers
+        """
+        order = [{
+            'driver_number': d, 'name': self.driver_names.get(d, str(d)), 'color': self.driver_colors.get(d, '777777'),
+            'position': self.order[d][0],
+        } for d in self.running_order()]
+        live_points = {d: self.points_table.get(self.order[d][0], 0) for d in self.order}
+        drivers = set(self.base_points) | set(live_points)
+        before = sorted(drivers, key=lambda d: -self.base_points.get(d, 0))
+        projected = sorted(before, key=lambda d: -(self.base_points.get(d, 0) + live_points.get(d, 0)))
+        standings = [{
+            'driver_number': d, 'name': self.driver_names.get(d, str(d)), 'color': self.driver_colors.get(d, '777777'),
+            'points': self.base_points.get(d, 0) + live_points.get(d, 0), 'live_points': live_points.get(d, 0),
+            # places gained( positive) or lost since the start of the session
+            'change': before.index(d) - i,
+        } for i, d in enumerate(projected)]
+        return {
+            'live': True,
+            'session': {'session_key': self.session_key, 'name': session_label(self.session),
+                        'date_start': self.session.get('date_start'), 'date_end': self.session.get('date_end')},
+            'last_record': self.since,
+            'order': order,
+            'standings': standings,
+        }
+
+
+def idle_snapshot(race_sessions):
+    upcoming = next_session(race_sessions)
+    return {
+        'live': False,
+        'next_session': None if upcoming is None else {'session_key': upcoming['session_key'], 'name': session_label(upcoming),
+                                                        'date_start': upcoming.get('date_start')},
+    }
+
+
+def write_state(path, state):
+    # unique temp file and rename like every other file the workers read, two writers never share a temp path
+    publish_file(path, json.dumps(state, separators=(',', ':')).encode())
+
+
+def load_seq(path):
+    try:
+        with open(path) as f:
+            return json.load(f).get('seq', 0)
+    except (OSError, ValueError):
+        return 0
+
+
+class LivePoller:
+    """
+    The session list( cached for SESSIONS_MAX_AGE, see apiCache.py) every LIVE_IDLE_INTERVAL, /position every
+    LIVE_POLL_INTERVAL while a session is running, and the state written to state_path every time something changed
+    published( optional) gets every state written, e.g. to hand it to the other hosts
+    """
+
+    def __init__(self, state_path, published=None):
+        self.state_path = state_path
+        self.published = published
+        self.tracker = None
+        self.idle_published = False
+
+    def publish(self, state):
+        # the sequence number( the event id of /live) goes on from the file, whoever wrote it last( a poller that died,
+        # the poller of another host)
+        state = dict(state, seq=load_seq(self.state_path) + 1, updated=time.time())
+        write_state(self.state_path, state)
+        if self.published is not None:
+            self.published(state)
+
+    def step(self):
+        """
+        One look at the api, returns the seconds to wait before the next one
+        """
+        try:
+            year = datetime.date.today().year
+            race_sessions = race_sessions_of(get_json('sessions', {'year': year}, max_age=SESSIONS_MAX_AGE) or [])
+            session = find_live_session(race_sessions)
+            if session is None:
+                self.tracker = None
+                if not self.idle_published:
+                    self.publish(idle_snapshot(race_sessions))
+                    self.idle_published = True
+                return LIVE_IDLE_INTERVAL
+            self.idle_published = False
+            if self.tracker is None or self.tracker.session_key != session['session_key']:
+                print(f"Following {session_label(session)} live")
+                self.tracker = LiveSession(session, *base_standings(year, session['session_key']))
+                self.tracker.poll()
+                changed = True
+            else:
+                changed = self.tracker.poll()
+            METRICS.inc('live_polls_total', outcome='changed' if changed else 'unchanged')
+            if changed:
+                self.publish(self.tracker.snapshot())
+            return LIVE_POLL_INTERVAL
+        except Exception as e:
+            # the api is down or slow, the browsers keep the last state and the next poll tries again
+            METRICS.inc('live_polls_total', outcome='failed')
+            print(f"Live poll failed: {e}")
+            return LIVE_POLL_INTERVAL if self.tracker is not None else LIVE_IDLE_INTERVAL
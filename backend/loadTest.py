@@ -0,0 +1,283 @@
+"""
+Load test of the server as it is deployed( gunicorn with gunicorn.conf.py) against replayServer.py, for a few
+worker/thread configurations
+
+    python loadTest.py [--configs 1x1,2x4,4x8] [--duration 30] [--clients 4] [--connections 8] [--output load.json]
+
+Each configuration is a fresh gunicorn( workers x threads) serving from a temporary directory that all of them share, so
+only the first one starts with nothing on disk; the current season comes from fixtures/YEAR( generated if missing) and the
+server reaches the replay server through OPENF1_BASE_URL
+- clients processes with connections keep-alive connections each ask for /, /plot1.png and /plot2.png in the proportions of
+  MIX, with the Accept headers of a browser or of anything else, half of the plot requests revalidating with the last ETag
+- expiries times in the run the refresh state is made to expire( next_check at that instant, no fingerprint so a whole
+  regeneration follows) and burst new connections per client fire a request exactly then, the cache-expiry stampede
+The report has p50/p90/p99/max latency, throughput and error rate( 5xx or no answer) for each configuration, for all the
+requests, for the bursts and for the requests in the expiry_window seconds after each expiry, and how many regenerations
+finished during the run( an expiry that comes while the previous regeneration is still going is overwritten by it)
+"""
+import argparse
+import datetime
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from replayServer import FIXTURES_DIR, ReplayServer, fixture_path, generate_season
+
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# (path, weight) of the steady traffic, a page view is / and then both plots
+MIX = [('/', 1), ('/plot1.png', 2), ('/plot2.png', 2)]
+ACCEPT_HEADERS = ['image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8', '*/*']
+REFRESH_STATE_FILE = 'static/refresh_state.json'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def send(conn, path, etag=None):
+    """
+    One request on a keep-alive connection, returns (status, etag of the answer)
+    """
+    headers = {'Accept': random.choice(ACCEPT_HEADERS), 'Accept-Encoding': 'gzip, br'}
+    if etag:
+        headers['If-None-Match'] = etag
+    conn.request('GET', path, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return response.status, response.getheader('ETag')
+
+
+def connection_loop(port, end, samples, seed):
+    rng = random.Random(seed)
+    paths = [path for path, weight in MIX for _ in range(weight)]
+    etags = {}
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while time.time() < end:
+        path = rng.choice(paths)
+        revalidate = path != '/' and rng.random() < 0.5
+        start = time.time()
+        try:
+            status, etag = send(conn, path, etags.get(path) if revalidate else None)
+            if etag:
+                etags[path] = etag
+        except (OSError, http.client.HTTPException):
+            status = None
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        samples.append((start, time.time() - start, status, False))
+    conn.close()
+
+
+def burst_request(port, at, samples):
+    # a new connection opened ahead, the request itself goes out at the instant of the expiry
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        conn.connect()
+        time.sleep(max(0.0, at - time.time()))
+        start = time.time()
+        status, _ = send(conn, random.choice(['/plot1.png', '/plot2.png']))
+    except (OSError, http.client.HTTPException):
+        start = max(at, time.time())
+        status = None
+    finally:
+        conn.close()
+    samples.append((start, time.time() - start, status, True))
+
+
+def client_main(port, end, connections, expiries, burst, seed):
+    """
+    One client process: connections loops until end and burst requests at every expiry, returns the samples as
+    (start time, seconds, status or None, part of a burst)
+    """
+    samples = []
+    threads = [threading.Thread(target=connection_loop, args=(port, end, samples, seed * 1000 + i)) for i in range(connections)]
+    for at in expiries:
+        threads += [threading.Timer(max(0.0, at - 1 - time.time()), burst_request, args=(port, at, samples)) for _ in range(burst)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def expire_refresh_state(at):
+    """
+    Make the check scheduled by the refresh policy due at `at`, with no fingerprint so the check regenerates the plots
+    """
+    try:
+        with open(REFRESH_STATE_FILE) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    state['next_check'] = at
+    state['fingerprint'] = None
+    tmp = REFRESH_STATE_FILE + '.loadtest'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, REFRESH_STATE_FILE)
+
+
+def last_render():
+    try:
+        with open(REFRESH_STATE_FILE) as f:
+            return json.load(f).get('last_render')
+    except (OSError, ValueError):
+        return None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def stats(samples, seconds):
+    latencies = sorted(latency * 1000 for _, latency, _, _ in samples)
+    statuses = {}
+    for _, _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for _, _, status, _ in samples if status is None or status >= 500)
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / seconds, 1) if seconds else None,
+        'error_rate': round(errors / len(samples), 4) if samples else None,
+        'p50_ms': percentile(latencies, 0.5),
+        'p90_ms': percentile(latencies, 0.9),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': latencies[-1] if latencies else None,
+        'statuses': statuses,
+    }
+
+
+def wait_until_serving(port, server, timeout):
+    # the very first start has no plots yet( 503) until the background refresher made them
+    start = time.time()
+    while time.time() - start < timeout:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {server.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/plot1.png')
+            if conn.getresponse().status == 200:
+                return time.time() - start
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"no plots served after {timeout} s")
+
+
+def run_config(workers, threads, args, base_url, pool):
+    port = free_port()
+    env = dict(os.environ, OPENF1_BASE_URL=base_url, WEB_CONCURRENCY=str(workers))
+    server = subprocess.Popen(['gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'), '--pythonpath', BACKEND_DIR,
+                               '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads), 'flaskServer:app'],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = wait_until_serving(port, server, args.ready_timeout)
+        start = time.time() + 1
+        end = start + args.duration
+        expiries = [start + args.duration * (i + 1) / (args.expiries + 1) for i in range(args.expiries)]
+        clients = [pool.apply_async(client_main, (port, end, args.connections, expiries, args.burst, seed)) for seed in range(args.clients)]
+        # the renders finished during the run, seen from the refresh state
+        renders = set()
+        seen = last_render()
+        pending = list(expiries)
+        while time.time() < end:
+            if pending and time.time() >= pending[0] - 1:
+                expire_refresh_state(pending.pop(0))
+            rendered = last_render()
+            if rendered != seen:
+                renders.add(rendered)
+                seen = rendered
+            time.sleep(0.1)
+        samples = [sample for client in clients for sample in client.get()]
+    finally:
+        server.terminate()
+        server.wait()
+
+    steady = [s for s in samples if not s[3]]
+    after_expiry = [s for s in steady if any(at <= s[0] < at + args.expiry_window for at in expiries)]
+    return {
+        'workers': workers,
+        'threads': threads,
+        'seconds_to_serving': round(ready, 2),
+        'all': stats(steady, args.duration),
+        'bursts': stats([s for s in samples if s[3]], None),
+        'after_expiry': stats(after_expiry, args.expiry_window * len(expiries)),
+        'renders_during_run': len(renders),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the gunicorn deployment against the replay server')
+    parser.add_argument('--configs', default='1x1,2x4,4x8', help='workers x threads, comma separated')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of traffic per configuration')
+    parser.add_argument('--clients', type=int, default=4, help='client processes')
+    parser.add_argument('--connections', type=int, default=8, help='keep-alive connections per client process')
+    parser.add_argument('--expiries', type=int, default=2, help='expiries of the plots during each run')
+    parser.add_argument('--burst', type=int, default=8, help='requests per client process exactly at every expiry')
+    parser.add_argument('--expiry-window', type=float, default=5)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the replay server waits before answering')
+    parser.add_argument('--fixtures', default=os.path.join(BACKEND_DIR, FIXTURES_DIR))
+    parser.add_argument('--ready-timeout', type=float, default=180)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    year = datetime.date.today().year
+    if not os.path.exists(fixture_path(args.fixtures, year, 'sessions')):
+        print(f"No fixtures for {year}, generating them", file=sys.stderr)
+        generate_season(year, args.fixtures, upcoming=3)
+    replay = ReplayServer(args.fixtures, latency=args.latency, seed=0)
+    base_url = replay.start()
+
+    workdir = tempfile.mkdtemp(prefix='f1plots-load-')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    results = []
+    try:
+        with multiprocessing.get_context('spawn').Pool(args.clients) as pool:
+            for config in args.configs.split(','):
+                workers, threads = (int(n) for n in config.lower().split('x'))
+                print(f"{workers} workers x {threads} threads...", file=sys.stderr)
+                result = run_config(workers, threads, args, base_url, pool)
+                results.append(result)
+                print(f"  p50 {result['all']['p50_ms']:.1f} ms, p99 {result['all']['p99_ms']:.1f} ms, "
+                      f"{result['all']['throughput_rps']} req/s, errors {result['all']['error_rate']:.2%}, "
+                      f"burst p99 {result['bursts']['p99_ms'] or 0:.1f} ms", file=sys.stderr)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        replay.shutdown()
+
+    report = {
+        'created': time.time(),
+        'duration': args.duration,
+        'clients': args.clients,
+        'connections': args.connections,
+        'expiries': args.expiries,
+        'burst': args.burst,
+        'replay_latency': args.latency,
+        'api_requests': replay.counts,
+        'configs': results,
+    }
+    output = json.dumps(report, indent=1)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+import cProfile
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+# every process( gunicorn worker) writes its own numbers here and /metrics adds up those of the processes still alive
+METRICS_DIR = 'cache/metrics'
+# touch this file and the next check of the plots regenerates them under cProfile, the profile goes to PROFILES_DIR
+PROFILE_TRIGGER_PATH = 'cache/profile_next_regeneration'
+PROFILES_DIR = 'cache/profiles'
+
+PREFIX = 'f1plots_'
+# upper bounds( seconds) of the histogram buckets of the stage timings, from a cached lookup to a cold render
+STAGE_BUCKETS = (0.001, 0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+HELP = {
+    'stage_seconds': 'Time spent in each stage of a refresh',
+    'upstream_requests_total': 'Requests sent to the openf1 api( every attempt), by endpoint and status',
+    'upstream_bytes_total': 'Bytes of the bodies received from the openf1 api, by endpoint',
+    'cache_lookups_total': 'Lookups in the sqlite response cache, by endpoint and result',
+    'session_results_total': 'Session results fetched, by method( session_result or the position fallback)',
+    'empty_results_total': 'Empty answers for sessions that are over, asked again',
+    'skipped_sessions_total': 'Sessions over for more than FINALIZE_DELAY still without results, left out of the season',
+    'regenerations_total': 'Checks of the plots, by season and outcome',
+    'live_polls_total': 'Polls of /position by the live poller, by outcome( running order changed or not, failed)',
+    'live_records_total': '/position records received by the live poller',
+    'live_streams_total': '/live streams opened',
+    'artifact_store_copies_total': 'Files a replica copied from the artifact store',
+}
+
+
+def label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """
+    Counters and histograms of one process, by name and labels
+    snapshot/merge move them between processes( the render processes send theirs back with every render)
+    """
+
+    def __init__(self):
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [count per bucket( not cumulative, last one is +Inf), count, sum]
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(STAGE_BUCKETS) + 1), 0, 0.0]
+            bucket = next((i for i, bound in enumerate(STAGE_BUCKETS) if value <= bound), len(STAGE_BUCKETS))
+            histogram[0][bucket] += 1
+            histogram[1] += 1
+            histogram[2] += value
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), buckets[:], count, total] for (name, labels), (buckets, count, total) in self.histograms.items()],
+            }
+
+    def merge(self, snapshot):
+        with self.lock:
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(tuple(label) for label in labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, buckets, count, total in snapshot['histograms']:
+                key = (name, tuple(tuple(label) for label in labels))
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    self.histograms[key] = [buckets[:], count, total]
+                else:
+                    histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+                    histogram[1] += count
+                    histogram[2] += total
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def dump(self, directory=METRICS_DIR):
+        """
+        Write the numbers of this process to directory/PID.json( temp file and rename, a reader never sees half of it)
+        The temp file has a name of its own: the refresher and a /metrics request of the same process can dump together
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.getpid()}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect(directory=METRICS_DIR):
+    """
+    The numbers of every process that dumped them and is still alive, added up; the files of dead processes are removed
+    ( their counters are gone with them, Prometheus sees that as a counter reset)
+    """
+    total = Metrics()
+    if not os.path.isdir(directory):
+        return total
+    for name in os.listdir(directory):
+        pid = name[:-len('.json')]
+        if not (name.endswith('.json') and pid.isdigit()):
+            continue
+        path = os.path.join(directory, name)
+        if not process_alive(int(pid)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                total.merge(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = [(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def prometheus_text(metrics, gauges=None):
+    """
+    Prometheus text exposition format( 0.0.4) of the metrics, plus gauges {name: value} computed by the caller
+    """
+    lines = []
+    snapshot = metrics.snapshot()
+    counters = {}
+    for name, labels, value in snapshot['counters']:
+        counters.setdefault(name, []).append((labels, value))
+    for name in sorted(counters):
+        lines += [f'# HELP {PREFIX}{name} {HELP.get(name, name)}', f'# TYPE {PREFIX}{name} counter']
+        for labels, value in sorted(counters[name]):
+            lines.append(f'{PREFIX}{name}{format_labels(labels)} {value}')
+
+    histograms = {}
+    for name, labels, buckets, count, total in snapshot['histograms']:
+        histograms.setdefault(name, []).append((labels, buckets, count, total))
+    for name in sorted(histograms):
+        lines += [f'# HELP {PREFIX}{name} {HELP.get(name, name)}', f'# TYPE {PREFIX}{name} histogram']
+        for labels, buckets, count, total in sorted(histograms[name]):
+            cumulative = 0
+            for bound, bucket in zip(list(STAGE_BUCKETS) + ['+Inf'], buckets):
+                cumulative += bucket
+                lines.append(f'{PREFIX}{name}_bucket{format_labels(labels, [("le", str(bound))])} {cumulative}')
+            lines.append(f'{PREFIX}{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{PREFIX}{name}_count{format_labels(labels)} {count}')
+
+    for name, value in sorted((gauges or {}).items()):
+        if value is not None:
+            lines += [f'# TYPE {PREFIX}{name} gauge', f'{PREFIX}{name} {value}']
+    return '\n'.join(lines) + '\n'
+
+
+def profile_requested():
+    return os.path.exists(PROFILE_TRIGGER_PATH)
+
+
+def run_profiled(name, function, *args):
+    """
+    function(*args) under cProfile, the stats go to PROFILES_DIR/NAME-TIMESTAMP.prof( python -m pstats to read them)
+    and the trigger file is removed; the rendering happens in a render process, here it only shows up as the wait for it
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        path = os.path.join(PROFILES_DIR, f'{name}-{time.strftime("%Y%m%d-%H%M%S")}.prof')
+        profiler.dump_stats(path)
+        if os.path.exists(PROFILE_TRIGGER_PATH):
+            os.remove(PROFILE_TRIGGER_PATH)
+        print(f"Profile of the {name} written to {path}")
+
+
+METRICS = Metrics()
@@ -1,10 +1,28 @@
-import matplotlib.pyplot as plt
-import io
 from apiConnect import *
+from apiCache import get_json
+from metrics import METRICS
+from plotRenderer import render_plots, render_artifacts
+from refreshPolicy import race_sessions_of
+from scenarioEngine import season_scenarios, remaining_session_types
 import datetime
+import hashlib
+import json
+import plotRenderer
 
-def generate_plots(year= datetime.date.today().year):
-    driver_positions, driver_points, driver_names, driver_teams, driver_colors, driver_history, session_names, sessionCounter = get_all_season_results(year, debug=True)
+def plot_data(year=None):
+    """
+    Everything the renderer needs for the season, in the order render_plots/render_artifacts take it
+    year None is the current one, decided now and not when the module was imported
+    """
+    if year is None:
+        year = datetime.date.today().year
+    return plot_data_from_results(get_all_season_results(year, debug=True, incremental=True), year)
+
+def plot_data_from_results(season_results, year):
+    """
+    plot_data for results already fetched( what get_all_season_results returns)
+    """
+    driver_positions, driver_points, driver_names, driver_teams, driver_colors, driver_history, session_names, sessionCounter = season_results
     print(session_names)
 
     standings = sorted(driver_points.items(), key=lambda x: x[1], reverse=True)
@@ -13,58 +31,54 @@ def generate_plots(year= datetime.date.today().year):
         for driver_num, points in standings 
     ]
 
-    # Prepare data for plotting
-    plt_pts = [points for _, points, _, _, _ in complete_standings]
-    plt_names = [name + '\n' + str(num) for num, _, name, _, _ in complete_standings]
-    plt_clrs = ['#' + color for _, _, _, _, color in complete_standings]
-
-    # --- Plot 1: Points Distribution ---
-    fig1, ax1 = plt.subplots(figsize=(12, 6))
-    fig1.patch.set_facecolor('#333333')  # Dark gray background
-    ax1.set_facecolor('#333333')  # Dark gray background
-    ax1.bar(plt_names, plt_pts, color=plt_clrs)
-    # Add point labels on top of bars
-    for i, (name, points, color) in enumerate(zip(plt_names, plt_pts, plt_clrs)):
-        ax1.text(i, points + 1, str(points), ha='center', va='bottom', color=color, fontsize=13)
-    ax1.hlines(plt_pts[0] - 25, 0, len(plt_names) - 1, colors='black', linestyles='--')
-    ax1.set_xlabel('Drivers')
-    ax1.set_ylabel('Points')
-    ax1.set_title(f'F1 {year} Season Points Distribution')
-    ax1.set_xticklabels(plt_names, rotation=45)
-    ax1.grid(linestyle='-.', which='both')
-    fig1.tight_layout()
+    # who can still win: the sessions left come from the session list get_all_season_results just asked for( cached),
+    # a past season has none left
+    remaining = []
+    if year >= datetime.date.today().year:
+        remaining = remaining_session_types(race_sessions_of(get_json('sessions', {'year': year}) or []), sessionCounter)
+    with METRICS.timer('scenarios'):
+        scenario = season_scenarios(complete_standings, driver_positions, remaining)
 
-    # Save to buffer
-    buf1 = io.BytesIO()
-    fig1.savefig(buf1, format='png')
-    buf1.seek(0)
-    plt.show()
-#    plt.close(fig1)
+    return complete_standings, driver_history, driver_names, driver_colors, session_names, year, scenario
 
-    # --- Plot 2: Points History ---
-    fig2, ax2 = plt.subplots(figsize=(12, 6))
-    fig2.patch.set_facecolor('#333333')  # Dark gray background
-    ax2.set_facecolor('#333333')  # Dark gray background
-    for key, values in driver_history.items():
-        label = driver_names.get(key, f"Driver {key}")
-        color = '#' + driver_colors.get(key, '777777')
-#        print(session_names)############################################################################################################################
-#        print(values)###################################################################################################################################
-        ax2.plot(session_names, values, label=label, marker='o', color=color)
-        ax2.text(session_names[-1], values[-1], f' {label}', va='center', ha='left', color=color, fontsize=10)
-    ax2.set_title(f'F1 {year} Season Points History')
-    ax2.set_xlabel("Session")
-    ax2.set_ylabel("Points")
-    ax2.grid(linestyle='-.', which='both')
-    ax2.set_xticklabels(session_names, rotation=45)
-    fig2.tight_layout()
+def inputs_fingerprint(data):
+    """
+    Hash of everything a render depends on: the plot data, the variants and the code of the renderer itself
+    Same fingerprint, same files
+    """
+    with open(plotRenderer.__file__, 'rb') as f:
+        renderer_source = f.read()
+    digest = hashlib.sha256(renderer_source)
+    digest.update(json.dumps([data, [suffix for suffix, _, _, _ in plotRenderer.ARTIFACT_VARIANTS]], sort_keys=True).encode())
+    return digest.hexdigest()
 
-    # Save to buffer
-    buf2 = io.BytesIO()
-    fig2.savefig(buf2, format='png')
-    buf2.seek(0)
-#    plt.show()
-    plt.close(fig2)
+def season_document(data):
+    """
+    The season as json for the page to draw it itself, columnar: one array per field, drivers in standings order,
+    history has one row of cumulative points per driver( same order) and one column per session
+    """
+    complete_standings, driver_history, driver_names, driver_colors, session_names, year, scenario = data
+    numbers = [driver_num for driver_num, _, _, _, _ in complete_standings]
+    document = {
+        'year': year,
+        'sessions': list(session_names),
+        'drivers': numbers,
+        'names': [name for _, _, name, _, _ in complete_standings],
+        'teams': [team for _, _, _, team, _ in complete_standings],
+        'colors': [color for _, _, _, _, color in complete_standings],
+        'points': [points for _, points, _, _, _ in complete_standings],
+        'history': [driver_history.get(driver_num, []) for driver_num in numbers],
+        # max_points, eliminated, title_probability in the same order, see scenarioEngine.py
+        'scenario': scenario,
+    }
+    return json.dumps(document, separators=(',', ':')).encode()
 
+def generate_plots(year=None):
+    # --- both plots are drawn by the rendering engine, see plotRenderer.py ---
+    return render_plots(*plot_data(year))
 
-    return buf1, buf2
+def generate_plot_artifacts(year=None):
+    """
+    The two plots in every format and size the server can send( see ARTIFACT_VARIANTS in plotRenderer.py), rendered once
+    """
+    return render_artifacts(*plot_data(year))
@@ -0,0 +1,227 @@
+import gzip
+import io
+import threading
+
+from metrics import METRICS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # no .svg.br variant, gzip only
+
+
+FIGSIZE = (12, 6)
+BACKGROUND_COLOR = '#333333'  # Dark gray background
+
+# pixel widths of the bitmap variants, DEFAULT_WIDTH( 12in at 100dpi) is the plot1.png/plot2.png there has always been
+RASTER_WIDTHS = (600, 1200, 2400)
+DEFAULT_WIDTH = 1200
+RASTER_FORMATS = ('png', 'webp')
+WEBP_QUALITY = 85
+
+def artifact_variants():
+    """
+    Every file produced by a render as (suffix, format, width, content encoding), width None for the svg which fits any width
+    The suffix is what goes after plot1/plot2 in the file name
+    """
+    variants = []
+    for fmt in RASTER_FORMATS:
+        for width in RASTER_WIDTHS:
+            suffix = f'.{fmt}' if width == DEFAULT_WIDTH else f'-{width}.{fmt}'
+            variants.append((suffix, fmt, width, None))
+    variants.append(('.svg', 'svg', None, None))
+    variants.append(('.svg.gz', 'svg', None, 'gzip'))
+    if brotli is not None:
+        variants.append(('.svg.br', 'svg', None, 'br'))
+    return variants
+
+ARTIFACT_VARIANTS = artifact_variants()
+
+# the two figures are built and styled once per process, every render only replaces the data artists
+_templates = {}
+_render_lock = threading.Lock()
+
+
+def figure_classes():
+    """
+    matplotlib is imported here, the first time a figure is actually needed, so importing this module( the server does,
+    for ARTIFACT_VARIANTS) costs nothing
+    """
+    import matplotlib
+    matplotlib.use('Agg')  # never a gui on the server, and no pyplot figure manager keeping figures alive
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    return Figure, FigureCanvasAgg
+
+
+def styled_figure(xlabel, ylabel):
+    """
+    Figure with the fixed styling of the plots( dark background, grid, axis labels), attached to an Agg canvas
+    Created through the object oriented api, pyplot never knows about it so it is freed like any other object
+    """
+    Figure, FigureCanvasAgg = figure_classes()
+    fig = Figure(figsize=FIGSIZE)
+    FigureCanvasAgg(fig)
+    fig.patch.set_facecolor(BACKGROUND_COLOR)
+    ax = fig.add_subplot()
+    ax.set_facecolor(BACKGROUND_COLOR)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.grid(linestyle='-.', which='both')
+    return fig, ax
+
+
+def get_templates():
+    if not _templates:
+        _templates['points'] = styled_figure('Drivers', 'Points')
+        _templates['history'] = styled_figure('Session', 'Points')
+    return _templates
+
+
+def clear_data(ax):
+    """
+    Remove everything the previous render drew, keeping the styling
+    """
+    for container in list(ax.containers):
+        container.remove()
+    for artist in list(ax.lines) + list(ax.texts) + list(ax.collections) + list(ax.patches):
+        artist.remove()
+    # reset the data limits, the new artists set them again as they are added
+    ax.relim()
+
+
+def encode_png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    buf.seek(0)
+    return buf
+
+
+def encode_variants(fig):
+    """
+    All the ARTIFACT_VARIANTS of an already drawn figure, {suffix: bytes}
+    The figure is rasterized once per width and every bitmap format is encoded from that, the svg is encoded once
+    and compressed here, so the server only has to send the files as they are
+    """
+    from PIL import Image
+    variants = {}
+    original_dpi = fig.dpi
+    try:
+        for width in RASTER_WIDTHS:
+            fig.set_dpi(width / FIGSIZE[0])
+            fig.canvas.draw()
+            image = Image.frombuffer('RGBA', fig.canvas.get_width_height(physical=True), fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+            for suffix, fmt, variant_width, encoding in ARTIFACT_VARIANTS:
+                if variant_width != width:
+                    continue
+                buf = io.BytesIO()
+                if fmt == 'webp':
+                    image.save(buf, format='webp', quality=WEBP_QUALITY)
+                else:
+                    image.save(buf, format=fmt)
+                variants[suffix] = buf.getvalue()
+    finally:
+        fig.set_dpi(original_dpi)
+
+    buf = io.BytesIO()
+    # no date in the metadata, the same data gives the same bytes( and the same ETag)
+    fig.savefig(buf, format='svg', metadata={'Date': None})
+    svg = buf.getvalue()
+    variants['.svg'] = svg
+    variants['.svg.gz'] = gzip.compress(svg, compresslevel=9, mtime=0)
+    if brotli is not None:
+        variants['.svg.br'] = brotli.compress(svg)
+    return variants
+
+
+def draw_points_distribution(ax, complete_standings, year, scenario=None):
+    # Prepare data for plotting
+    plt_pts = [points for _, points, _, _, _ in complete_standings]
+    plt_names = [name + '\n' + str(num) for num, _, name, _, _ in complete_standings]
+    plt_clrs = ['#' + color for _, _, _, _, color in complete_standings]
+    x = list(range(len(plt_names)))
+
+    bars = ax.bar(x, plt_pts, color=plt_clrs)
+    # Add point labels on top of bars
+    for i, (points, color) in enumerate(zip(plt_pts, plt_clrs)):
+        ax.text(i, points + 1, str(points), ha='center', va='bottom', color=color, fontsize=13)
+    title = f'F1 {year} Season Points Distribution'
+    if scenario is not None and plt_pts:
+        # below the line even winning everything that is left doesn't reach the leader, those drivers are faded
+        threshold = plt_pts[0] - scenario['remaining_points']
+        if scenario['remaining_points'] and threshold > 0:
+            ax.hlines(threshold, 0, len(plt_names) - 1, colors='black', linestyles='--')
+        for bar, eliminated in zip(bars, scenario['eliminated']):
+            if eliminated and scenario['remaining_points']:
+                bar.set_alpha(0.35)
+        # chance of winning the title( Monte Carlo, see scenarioEngine.py) inside the bars of the contenders
+        if scenario['clinched'] is None:
+            for i, (points, probability) in enumerate(zip(plt_pts, scenario['title_probability'])):
+                if probability >= 0.005:
+                    ax.text(i, points - 1, f'{probability:.0%}', ha='center', va='top', color='white', fontsize=9)
+        else:
+            champion = next(name for num, _, name, _, _ in complete_standings if num == scenario['clinched'])
+            title += f' - {champion} champion'
+    ax.set_title(title)
+    ax.set_xticks(x, plt_names, rotation=45)
+
+
+def draw_points_history(ax, driver_history, driver_names, driver_colors, session_names, year):
+    # sessions are placed at 0..n-1 and named through the tick labels, so nothing is left over from the sessions of a previous render
+    x = list(range(len(session_names)))
+    for key, values in driver_history.items():
+        label = driver_names.get(key, f"Driver {key}")
+        color = '#' + driver_colors.get(key, '777777')
+        ax.plot(x, values, label=label, marker='o', color=color)
+        if values:
+            ax.text(x[-1], values[-1], f' {label}', va='center', ha='left', color=color, fontsize=10)
+    ax.set_title(f'F1 {year} Season Points History')
+    ax.set_xticks(x, session_names, rotation=45)
+
+
+def draw_plots(complete_standings, driver_history, driver_names, driver_colors, session_names, year, scenario=None):
+    """
+    Draw the new data on the two pre-styled figures and return them, call it holding _render_lock
+    """
+    templates = get_templates()
+
+    # --- Plot 1: Points Distribution ---
+    fig1, ax1 = templates['points']
+    clear_data(ax1)
+    draw_points_distribution(ax1, complete_standings, year, scenario)
+    ax1.autoscale_view()
+    fig1.tight_layout()
+
+    # --- Plot 2: Points History ---
+    fig2, ax2 = templates['history']
+    clear_data(ax2)
+    draw_points_history(ax2, driver_history, driver_names, driver_colors, session_names, year)
+    ax2.autoscale_view()
+    fig2.tight_layout()
+
+    return fig1, fig2
+
+
+def render_plots(complete_standings, driver_history, driver_names, driver_colors, session_names, year, scenario=None):
+    """
+    Render the two plots on the pre-styled figures and return them as png buffers
+    complete_standings is [(driver_num, points, name, team, color)] sorted by points, like plotGenerator builds it,
+    scenario( optional) is what scenarioEngine.season_scenarios gives for it
+    """
+    with _render_lock:
+        with METRICS.timer('figure_build'):
+            fig1, fig2 = draw_plots(complete_standings, driver_history, driver_names, driver_colors, session_names, year, scenario)
+        with METRICS.timer('encode'):
+            return encode_png(fig1), encode_png(fig2)
+
+
+def render_artifacts(complete_standings, driver_history, driver_names, driver_colors, session_names, year, scenario=None):
+    """
+    Same as render_plots but the figures are drawn once and saved in every format/size of ARTIFACT_VARIANTS,
+    returns ({suffix: bytes} of plot 1, {suffix: bytes} of plot 2)
+    """
+    with _render_lock:
+        with METRICS.timer('figure_build'):
+            fig1, fig2 = draw_plots(complete_standings, driver_history, driver_names, driver_colors, session_names, year, scenario)
+        with METRICS.timer('encode'):
+            return encode_variants(fig1), encode_variants(fig2)
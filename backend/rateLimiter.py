@@ -0,0 +1,45 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket, every request takes a token and tokens come back at `rate` per second
+    up to `capacity`, so short bursts go out immediately and the long term rate never goes above `rate`
+    """
+
+    def __init__(self, rate, capacity):
+        self.configure(rate, capacity)
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def configure(self, rate, capacity):
+        """
+        Change the rate( tokens per second) and the burst size
+        """
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate must be positive and capacity at least 1")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """
+        Block until a token is available, then take it
+        Returns the time spent waiting, in seconds
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
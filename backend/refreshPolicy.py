@@ -0,0 +1,107 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+
+from apiCache import get_json, lookup, parse_date, session_is_final, session_has_started, PROVISIONAL_MAX_AGE
+
+
+# right after a Race/Sprint ends, check this often until its results show up in session_result
+ACTIVE_POLL_INTERVAL = 120
+# results are in but can still change( penalties) until the session is final
+SETTLING_POLL_INTERVAL = 30 * 60
+# nothing going on, a cheap check of the session list once a day is enough
+IDLE_POLL_INTERVAL = 24 * 3600
+# stop polling aggressively if the results of a session are still missing this long after its end
+RESULTS_WAIT_MAX = 12 * 3600
+
+
+def race_sessions_of(sessions):
+    """
+    The Race and Sprint sessions of a session list, in date order( same filter as get_all_season_results)
+    """
+    race_sessions = [s for s in sessions if s.get('session_type') in ['Race'] and
+                     s.get('session_name') in ['Race', 'Sprint']]
+    race_sessions.sort(key=lambda x: x['date_start'])
+    return race_sessions
+
+
+def probe_season(year):
+    """
+    Lightweight check of what changed in a season, without downloading it all
+    Asks for the session list and for the session_result of the sessions that started but are not final yet
+    (usually none, one or two), and of the final ones that only had the /position fallback so far( hourly, see
+    PROVISIONAL_MAX_AGE), until their official results show up; everything else can't have changed
+    Returns a dict with the fingerprint of all that, the race sessions, the keys of the sessions that have results and
+    the keys of the final sessions still without official results( provisional)
+    """
+    sessions = get_json('sessions', {'year': year})
+    race_sessions = race_sessions_of(sessions or [])
+
+    with_results = []
+    provisional = []
+    changing = []
+    for session in race_sessions:
+        if not session_has_started(session):
+            continue
+        params = {'session_key': session['session_key']}
+        if session_is_final(session):
+            cached = lookup('session_result', params)
+            if cached is not None and cached[1]:
+                continue
+            # stored for good as soon as it has the official results, from then on the session is skipped here, so it
+            # is in the fingerprint( empty) only until then: the change makes the plots be regenerated once
+            if get_json('session_result', params, final=True, max_age=PROVISIONAL_MAX_AGE):
+                continue
+            changing.append([session['session_key'], []])
+            provisional.append(session['session_key'])
+            continue
+        results = get_json('session_result', params)
+        if results:
+            with_results.append(session['session_key'])
+        changing.append([session['session_key'], results])
+
+    calendar = [[s['session_key'], s.get('session_name'), s.get('date_start'), s.get('date_end')] for s in race_sessions]
+    fingerprint = hashlib.sha256(json.dumps([calendar, changing], sort_keys=True).encode()).hexdigest()
+    return {'fingerprint': fingerprint, 'race_sessions': race_sessions, 'with_results': with_results, 'provisional': provisional}
+
+
+def next_check_time(race_sessions, with_results, now=None, provisional=()):
+    """
+    When the next check should happen, based on the race calendar
+    - a Race/Sprint just ended and its results are not in yet: every ACTIVE_POLL_INTERVAL
+    - results are in but the session is not final yet: every SETTLING_POLL_INTERVAL
+    - a final session only has the /position fallback( provisional, see probe_season): every PROVISIONAL_MAX_AGE
+    - a session is running: at its date_end
+    - otherwise: daily, or at the end of the next session if that comes first
+    Returns (timestamp, reason)
+    """
+    now = now or datetime.now(timezone.utc)
+    next_check = now + timedelta(seconds=IDLE_POLL_INTERVAL)
+    reason = 'idle'
+
+    for session in race_sessions:
+        start = parse_date(session.get('date_start'))
+        end = parse_date(session.get('date_end'))
+        if start is None or end is None:
+            continue
+        name = f"{session.get('country_name', 'Unknown')} {session.get('session_name', '')}".strip()
+
+        if start > now:
+            # first session in the future, nothing can change before it ends
+            if end < next_check:
+                next_check, reason = end, f'waiting for {name}'
+            break
+        if now < end:
+            next_check, reason = end, f'{name} running'
+            break
+        if session_is_final(session):
+            if session['session_key'] in provisional and now + timedelta(seconds=PROVISIONAL_MAX_AGE) < next_check:
+                next_check, reason = now + timedelta(seconds=PROVISIONAL_MAX_AGE), f'waiting for {name} official results'
+            continue
+        if session['session_key'] not in with_results:
+            if (now - end).total_seconds() < RESULTS_WAIT_MAX:
+                return (now + timedelta(seconds=ACTIVE_POLL_INTERVAL)).timestamp(), f'waiting for {name} results'
+        elif now + timedelta(seconds=SETTLING_POLL_INTERVAL) < next_check:
+            next_check, reason = now + timedelta(seconds=SETTLING_POLL_INTERVAL), f'{name} results not final yet'
+
+    return next_check.timestamp(), reason
@@ -0,0 +1,184 @@
+import multiprocessing
+import os
+import threading
+import time
+
+from metrics import METRICS
+
+
+# render processes per web worker, renders beyond that wait in the queue
+RENDER_PROCESSES = 1
+# a render process is replaced after this many renders, or as soon as its memory goes above RECYCLE_ABOVE_RSS_MB
+RECYCLE_AFTER_RENDERS = 25
+RECYCLE_ABOVE_RSS_MB = 400
+# a render taking longer than this is killed( with its process) and fails
+RENDER_TIMEOUT = 120
+# renders that can wait for a process, more than that are refused right away
+MAX_QUEUED_RENDERS = 4
+# render processes with nothing to do for this long are stopped, plots change a few times a week at most
+IDLE_TIMEOUT = 600
+
+
+class RenderError(Exception):
+    pass
+
+
+class RenderTimeout(RenderError):
+    pass
+
+
+class RenderQueueFull(RenderError):
+    pass
+
+
+def rss_mb():
+    # current resident set size, from /proc since ru_maxrss only gives the peak
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def render_process_main(conn):
+    """
+    Loop of a render process: season data in( the arguments of render_artifacts), encoded plots out, until the pipe is closed
+    matplotlib only ever lives in here, never in the web workers; the stage timings of every render go back with it
+    """
+    from plotRenderer import render_artifacts
+    while True:
+        try:
+            data = conn.recv()
+        except EOFError:
+            return
+        METRICS.reset()
+        try:
+            result = ('ok', render_artifacts(*data))
+        except Exception as e:
+            result = ('error', f'{type(e).__name__}: {e}')
+        try:
+            conn.send(result + (rss_mb(), METRICS.snapshot()))
+        except BrokenPipeError:
+            # the pool gave up on this render( timeout) and is killing us anyway
+            return
+
+
+class RenderProcess:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=render_process_main, args=(child_conn,), name='plot-render', daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.renders = 0
+        self.rss_mb = 0.0
+        self.idle_since = time.monotonic()
+
+    def stop(self, kill=False):
+        # closing the pipe ends render_process_main, a process stuck in a render( or any with kill=True) is killed
+        self.conn.close()
+        if not kill:
+            self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class RenderPool:
+    """
+    Small pool of dedicated render processes, render() sends them the season data and gets back the encoded plots
+
+    - processes are started when needed( spawn, not fork: the web worker has threads and a flask app that have no
+      business in a render process), stopped after IDLE_TIMEOUT with nothing to do
+    - every process is recycled after recycle_after renders or when its RSS passes recycle_above_rss_mb, so whatever
+      matplotlib keeps around never piles up
+    - a render that takes more than timeout seconds is killed and raises RenderTimeout, more than max_queued renders
+      waiting raise RenderQueueFull
+    """
+
+    def __init__(self, processes=RENDER_PROCESSES, recycle_after=RECYCLE_AFTER_RENDERS, recycle_above_rss_mb=RECYCLE_ABOVE_RSS_MB,
+                 timeout=RENDER_TIMEOUT, max_queued=MAX_QUEUED_RENDERS, idle_timeout=IDLE_TIMEOUT):
+        self.processes = processes
+        self.recycle_after = recycle_after
+        self.recycle_above_rss_mb = recycle_above_rss_mb
+        self.timeout = timeout
+        self.max_queued = max_queued
+        self.idle_timeout = idle_timeout
+        self.context = multiprocessing.get_context('spawn')
+        self.idle = []
+        self.pending = 0  # renders waiting or running
+        self.slots = threading.Semaphore(processes)
+        self.lock = threading.Lock()
+        self.stats = {'renders': 0, 'errors': 0, 'timeouts': 0, 'rejected': 0, 'started': 0, 'recycled': 0, 'last_rss_mb': None}
+
+    def render(self, data):
+        """
+        render_artifacts(*data) in a render process, returns what it returns
+        """
+        with self.lock:
+            if self.pending >= self.processes + self.max_queued:
+                self.stats['rejected'] += 1
+                raise RenderQueueFull(f"{self.pending} renders already waiting or running")
+            self.pending += 1
+        try:
+            with self.slots:
+                return self._render_in_process(data)
+        finally:
+            with self.lock:
+                self.pending -= 1
+            timer = threading.Timer(self.idle_timeout + 1, self.stop_idle)
+            timer.daemon = True
+            timer.start()
+
+    def _take_process(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+            self.stats['started'] += 1
+        return RenderProcess(self.context)
+
+    def _render_in_process(self, data):
+        worker = self._take_process()
+        try:
+            worker.conn.send(data)
+            if not worker.conn.poll(self.timeout):
+                self.stats['timeouts'] += 1
+                raise RenderTimeout(f"render took more than {self.timeout} s")
+            status, result, rss, timings = worker.conn.recv()
+        except RenderTimeout:
+            worker.stop(kill=True)
+            raise
+        except (EOFError, OSError) as e:
+            # the process died in the middle of it( killed by the OOM killer, crashed)
+            worker.stop()
+            self.stats['errors'] += 1
+            raise RenderError(f"render process died: {e!r}")
+
+        METRICS.merge(timings)
+        worker.renders += 1
+        worker.rss_mb = rss
+        self.stats['last_rss_mb'] = rss
+        if worker.renders >= self.recycle_after or rss > self.recycle_above_rss_mb:
+            worker.stop()
+            self.stats['recycled'] += 1
+        else:
+            worker.idle_since = time.monotonic()
+            with self.lock:
+                self.idle.append(worker)
+
+        if status != 'ok':
+            self.stats['errors'] += 1
+            raise RenderError(result)
+        self.stats['renders'] += 1
+        return result
+
+    def stop_idle(self, older_than=None):
+        """
+        Stop the processes that have been idle for more than older_than seconds( idle_timeout by default, 0 for all of them)
+        """
+        older_than = self.idle_timeout if older_than is None else older_than
+        now = time.monotonic()
+        with self.lock:
+            stale = [w for w in self.idle if now - w.idle_since >= older_than]
+            self.idle = [w for w in self.idle if w not in stale]
+        for worker in stale:
+            worker.stop()
+
+
+RENDER_POOL = RenderPool()
@@ -0,0 +1,424 @@
+"""
+Stand-in for api.openf1.org that answers from fixtures on disk, for benchmarks and load tests without the real api
+
+    python replayServer.py record --year 2024                 # download a season from openf1 into fixtures/2024/
+    python replayServer.py generate --year 2024               # or make up a realistic one( no network needed)
+    python replayServer.py generate --year 2026 --upcoming 3  # a season in progress, the last 3 rounds still to come
+    python replayServer.py generate --year 2026 --upcoming 3 --live  # same, with the next race starting right now
+    python replayServer.py serve --port 8765 --latency 0.05 --rate-429 0.02 --empty-rate 0.05 --speed 10
+
+then OPENF1_BASE_URL=http://127.0.0.1:8765/v1 for the server( see httpClient.py)
+
+fixtures/YEAR/sessions.json is the /sessions answer for the year, fixtures/YEAR/ENDPOINT/SESSION_KEY.json the
+/session_result, /position and /drivers answers of each session, exactly as openf1 gave them
+Queries are filtered the way openf1 does it( field=value, field>=value, date<value ...), an empty result is a 404 with
+{"detail": "No results found."} like openf1, and the server can add latency, 429s( with Retry-After) and empty answers
+Records dated after the clock of the server( real time, or --speed times faster from its start) are not there yet, so a
+race in the fixtures that is happening now comes out bit by bit like it would from openf1 during the race
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, unquote
+
+
+FIXTURES_DIR = 'fixtures'
+SESSION_ENDPOINTS = ['session_result', 'position', 'drivers']
+# injected empty answers only go to these, an empty /sessions would just be an empty season
+EMPTY_ENDPOINTS = ('session_result', 'position', 'drivers')
+RETRY_AFTER = 1
+
+FILTER_PATTERN = re.compile(r'^([A-Za-z_]+)(>=|<=|>|<|=)(.*)$', re.S)
+
+
+def fixture_path(directory, year, endpoint, session_key=None):
+    if session_key is None:
+        return os.path.join(directory, str(year), f'{endpoint}.json')
+    return os.path.join(directory, str(year), endpoint, f'{session_key}.json')
+
+
+def write_fixture(path, records):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(records, f, separators=(',', ':'))
+
+
+def parse_filters(query):
+    """
+    openf1 query string to [(field, operator, value)], 'date>=2024-03-02T15:00:00' is ('date', '>=', '2024-...')
+    """
+    filters = []
+    for part in query.split('&'):
+        match = FILTER_PATTERN.match(unquote(part))
+        if match:
+            filters.append(match.groups())
+    return filters
+
+
+def matches(record, filters):
+    for field, operator, value in filters:
+        actual = record.get(field)
+        if actual is None:
+            return False
+        # numbers are compared as numbers, everything else( dates too, they are all iso strings) as strings
+        if isinstance(actual, bool):
+            value = value.lower() == 'true'
+        elif isinstance(actual, (int, float)):
+            try:
+                value = type(actual)(value)
+            except ValueError:
+                return False
+        if operator == '=' and actual != value:
+            return False
+        if operator == '>=' and not actual >= value:
+            return False
+        if operator == '<=' and not actual <= value:
+            return False
+        if operator == '>' and not actual > value:
+            return False
+        if operator == '<' and not actual < value:
+            return False
+    return True
+
+
+class FixtureStore:
+    """
+    The fixtures of every year in the directory, each file read once and then kept in memory
+    """
+
+    def __init__(self, directory=FIXTURES_DIR):
+        self.directory = directory
+        self.files = {}
+        self.lock = threading.Lock()
+        self.sessions = []
+        self.session_years = {}  # session_key -> year
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                path = fixture_path(directory, name, 'sessions')
+                if name.isdigit() and os.path.exists(path):
+                    for session in self._load(path):
+                        self.sessions.append(session)
+                        self.session_years[session['session_key']] = int(name)
+
+    def _load(self, path):
+        with self.lock:
+            if path not in self.files:
+                try:
+                    with open(path) as f:
+                        self.files[path] = json.load(f)
+                except FileNotFoundError:
+                    self.files[path] = []
+            return self.files[path]
+
+    def query(self, endpoint, filters, until=None):
+        """
+        Records of the endpoint that match the filters, until( iso date) leaves out the records dated after it
+        """
+        if endpoint == 'sessions':
+            return [s for s in self.sessions if matches(s, filters)]
+        if endpoint not in SESSION_ENDPOINTS:
+            return []
+        # only the files of the sessions the session_key filters( =, >=, <= ...) let through are read
+        key_filters = [f for f in filters if f[0] == 'session_key']
+        records = []
+        for session_key, year in sorted(self.session_years.items()):
+            if matches({'session_key': session_key}, key_filters):
+                records.extend(r for r in self._load(fixture_path(self.directory, year, endpoint, session_key))
+                               if matches(r, filters) and (until is None or r.get('date') is None or r['date'] <= until))
+        return records
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        endpoint = self.endpoint = url.path.rstrip('/').rsplit('/', 1)[-1]
+        server.count(endpoint)
+        if server.latency or server.jitter:
+            time.sleep(server.latency + server.random.uniform(0, server.jitter))
+
+        if server.random.random() < server.rate_429:
+            server.count('injected_429')
+            return self.answer(429, {'detail': 'Too Many Requests'}, {'Retry-After': str(server.retry_after)})
+
+        records = server.store.query(endpoint, parse_filters(url.query), server.now().isoformat())
+        if endpoint in server.empty_endpoints and server.random.random() < server.empty_rate:
+            server.count('injected_empty')
+            records = []
+        if not records:
+            return self.answer(404, {'detail': 'No results found.'})
+        self.answer(200, records)
+
+    def answer(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.count('bytes', len(data))
+        self.server.count(f'bytes_{self.endpoint}', len(data))
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    The stand-in http server: latency seconds( plus up to jitter more) before every answer, rate_429 of the requests get
+    a 429 with Retry-After: retry_after, empty_rate of the requests to empty_endpoints get an empty answer
+    the clock of the server( what is already there) goes speed times faster than the real one from the start of the server
+    counts has the requests per endpoint, how many were made to fail, and the bytes sent( all and bytes_ENDPOINT)
+    """
+    daemon_threads = True
+
+    def __init__(self, directory=FIXTURES_DIR, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, rate_429=0.0,
+                 empty_rate=0.0, empty_endpoints=EMPTY_ENDPOINTS, retry_after=RETRY_AFTER, seed=None, speed=1.0):
+        super().__init__((host, port), ReplayHandler)
+        self.started = time.time()
+        self.speed = speed
+        self.store = FixtureStore(directory)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.empty_rate = empty_rate
+        self.empty_endpoints = empty_endpoints
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.counts = {}
+        self.counts_lock = threading.Lock()
+
+    def now(self):
+        return datetime.datetime.fromtimestamp(self.started + (time.time() - self.started) * self.speed, datetime.timezone.utc)
+
+    def real_time(self, date):
+        """
+        Real time( timestamp) at which a record dated `date` shows up
+        """
+        return self.started + (datetime.datetime.fromisoformat(date).timestamp() - self.started) / self.speed
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def count(self, name, amount=1):
+        with self.counts_lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def reset_counts(self):
+        with self.counts_lock:
+            counts, self.counts = self.counts, {}
+        return counts
+
+    def start(self):
+        """
+        Serve from a daemon thread, returns the base url to use as OPENF1_BASE_URL
+        """
+        threading.Thread(target=self.serve_forever, name='replay-server', daemon=True).start()
+        return self.base_url
+
+
+def record_season(year, directory=FIXTURES_DIR):
+    """
+    Download a season from the real api into fixtures: the session list, and /session_result, /position and /drivers
+    of every Race/Sprint that already started( through httpClient, so with its rate limit)
+    """
+    from apiCache import session_has_started
+    from httpClient import fetch_json
+
+    sessions = fetch_json('sessions', {'year': year})
+    write_fixture(fixture_path(directory, year, 'sessions'), sessions)
+    races = [s for s in sessions if s.get('session_type') == 'Race' and session_has_started(s)]
+    for i, session in enumerate(races, 1):
+        print(f"Recording session {session['session_key']} ({i}/{len(races)})")
+        for endpoint in SESSION_ENDPOINTS:
+            records = fetch_json(endpoint, {'session_key': session['session_key']})
+            write_fixture(fixture_path(directory, year, endpoint, session['session_key']), records)
+    return len(sessions)
+
+
+# synthetic seasons: 10 teams of 2, the calendar has the Italian, American and Spanish rounds that apiConnect names by circuit
+TEAMS = [
+    ('Red Bull Racing', '3671C6', [1, 11]), ('Ferrari', 'E8002D', [16, 55]), ('Mercedes', '27F4D2', [44, 63]),
+    ('McLaren', 'FF8000', [4, 81]), ('Aston Martin', '229971', [14, 18]), ('Alpine', 'FF87BC', [10, 31]),
+    ('Williams', '64C4FF', [23, 2]), ('RB', '6692FF', [22, 3]), ('Kick Sauber', '52E252', [77, 24]),
+    ('Haas F1 Team', 'B6BABD', [20, 27]),
+]
+ACRONYMS = {1: 'VER', 11: 'PER', 16: 'LEC', 55: 'SAI', 44: 'HAM', 63: 'RUS', 4: 'NOR', 81: 'PIA', 14: 'ALO', 18: 'STR',
+            10: 'GAS', 31: 'OCO', 23: 'ALB', 2: 'SAR', 22: 'TSU', 3: 'RIC', 77: 'BOT', 24: 'ZHO', 20: 'MAG', 27: 'HUL',
+            30: 'LAW'}
+# driver 30 takes the seat of driver 3 from this fraction of the season on, for the mid-season changes in driverRegistry.py
+SEAT_CHANGE = (3, 30, 0.75)
+CALENDAR = [
+    ('Bahrain', 'BRN', 'Sakhir'), ('Saudi Arabia', 'KSA', 'Jeddah'), ('Australia', 'AUS', 'Melbourne'),
+    ('Japan', 'JPN', 'Suzuka'), ('China', 'CHN', 'Shanghai'), ('United States', 'USA', 'Miami'),
+    ('Italy', 'ITA', 'Imola'), ('Monaco', 'MON', 'Monte Carlo'), ('Canada', 'CAN', 'Montreal'),
+    ('Spain', 'ESP', 'Catalunya'), ('Austria', 'AUT', 'Spielberg'), ('United Kingdom', 'GBR', 'Silverstone'),
+    ('Hungary', 'HUN', 'Hungaroring'), ('Belgium', 'BEL', 'Spa-Francorchamps'), ('Netherlands', 'NED', 'Zandvoort'),
+    ('Italy', 'ITA', 'Monza'), ('Azerbaijan', 'AZE', 'Baku'), ('Singapore', 'SGP', 'Singapore'),
+    ('United States', 'USA', 'Austin'), ('Mexico', 'MEX', 'Mexico City'), ('Brazil', 'BRA', 'Interlagos'),
+    ('United States', 'USA', 'Las Vegas'), ('Qatar', 'QAT', 'Lusail'), ('United Arab Emirates', 'UAE', 'Yas Marina'),
+]
+SPRINT_ROUNDS = {4, 5, 10, 18, 20, 22}
+RACE_LAPS = 57
+SPRINT_LAPS = 19
+
+
+def race_positions(rng, session, drivers, laps):
+    """
+    /position records of a made-up race: the grid, a few overtakes every lap and the retirements dropping to the back
+    Returns the records and the final order with the retired drivers
+    """
+    start = datetime.datetime.fromisoformat(session['date_start'])
+    order = drivers[:]
+    rng.shuffle(order)
+    records = []
+
+    def record(driver_number, position, at):
+        records.append({'date': at.isoformat(), 'session_key': session['session_key'], 'meeting_key': session['meeting_key'],
+                        'driver_number': driver_number, 'position': position})
+
+    for position, driver_number in enumerate(order, 1):
+        record(driver_number, position, start)
+    retired = set(rng.sample(order, rng.choice([0, 1, 1, 2, 3])))
+    retire_lap = {driver_number: rng.randrange(1, laps) for driver_number in retired}
+    running = len(order)
+    for lap in range(1, laps + 1):
+        at = start + datetime.timedelta(seconds=90 * lap + rng.uniform(0, 60))
+        for driver_number in [d for d in retired if retire_lap[d] == lap]:
+            i = order.index(driver_number)
+            order.append(order.pop(i))
+            running -= 1
+            for position in range(i + 1, len(order) + 1):
+                record(order[position - 1], position, at)
+        for _ in range(rng.choice([0, 0, 1, 1, 2, 3])):
+            i = rng.randrange(running - 1)
+            order[i], order[i + 1] = order[i + 1], order[i]
+            record(order[i], i + 1, at)
+            record(order[i + 1], i + 2, at)
+    return records, order, retired
+
+
+def generate_season(year, directory=FIXTURES_DIR, seed=0, upcoming=0, missing_results=1, live=False):
+    """
+    Write a made-up but openf1 shaped season to the fixtures: 24 rounds( 6 with a sprint) with practice and qualifying,
+    results, position streams and drivers for every round that already happened
+    upcoming > 0 puts the calendar around today with that many rounds still to come, the last missing_results races
+    that happened have no /session_result yet( like right after a race), so they go through the /position fallback
+    live( with upcoming > 0) has the first of the rounds to come start its race right now instead, its whole /position
+    stream is written and the server gives it out as its clock gets there
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    first_race = datetime.datetime(year, 3, 2, 15, tzinfo=datetime.timezone.utc)
+    race_days = [first_race + datetime.timedelta(days=7 * i + 7 * (i // 3)) for i in range(len(CALENDAR))]
+    if upcoming and live:
+        # the race of the first round to come starts now, the one before was a week or two ago
+        shift = now - race_days[len(CALENDAR) - upcoming]
+        race_days = [day + shift for day in race_days]
+    elif upcoming:
+        # the last race that happened was two days ago
+        shift = now - datetime.timedelta(days=2) - race_days[len(CALENDAR) - upcoming - 1]
+        race_days = [day + shift for day in race_days]
+
+    team_of = {d: (name, colour) for name, colour, numbers in TEAMS for d in numbers}
+    team_of[SEAT_CHANGE[1]] = team_of[SEAT_CHANGE[0]]
+    sessions = []
+    session_key = year * 1000
+    for round_index, ((country_name, country_code, circuit), race_day) in enumerate(zip(CALENDAR, race_days)):
+        sprint = round_index in SPRINT_ROUNDS
+        weekend = [('Practice', 'Practice 1', -2, 1), ('Qualifying', 'Sprint Qualifying' if sprint else 'Practice 2', -2, 1),
+                   ('Race', 'Sprint', -1, 0.5) if sprint else ('Practice', 'Practice 3', -1, 1),
+                   ('Qualifying', 'Qualifying', -1, 1), ('Race', 'Race', 0, 2)]
+        for session_type, session_name, day, hours in weekend:
+            session_key += 1
+            start = race_day + datetime.timedelta(days=day, hours=-3 if session_name not in ('Race', 'Qualifying') else 0)
+            sessions.append({
+                'session_key': session_key, 'session_type': session_type, 'session_name': session_name,
+                'date_start': start.isoformat(), 'date_end': (start + datetime.timedelta(hours=hours)).isoformat(),
+                'gmt_offset': '00:00:00', 'meeting_key': year * 100 + round_index + 1, 'location': circuit,
+                'country_code': country_code, 'country_name': country_name, 'circuit_short_name': circuit, 'year': year,
+                'round': round_index,
+            })
+    write_fixture(fixture_path(directory, year, 'sessions'), [{k: v for k, v in s.items() if k != 'round'} for s in sessions])
+
+    happened = [s for s in sessions if datetime.datetime.fromisoformat(s['date_start']) <= now]
+    races = [s for s in happened if s['session_type'] == 'Race']
+    no_results = {s['session_key'] for s in races[len(races) - missing_results:]} if missing_results else set()
+    for session in happened:
+        key = session['session_key']
+        drivers = [d for _, _, numbers in TEAMS for d in numbers]
+        if session['round'] >= SEAT_CHANGE[2] * len(CALENDAR):
+            drivers[drivers.index(SEAT_CHANGE[0])] = SEAT_CHANGE[1]
+        write_fixture(fixture_path(directory, year, 'drivers', key), [{
+            'session_key': key, 'meeting_key': session['meeting_key'], 'driver_number': d, 'name_acronym': ACRONYMS[d],
+            'broadcast_name': ACRONYMS[d], 'team_name': team_of[d][0], 'team_colour': team_of[d][1],
+        } for d in drivers])
+        if session['session_type'] != 'Race':
+            continue
+
+        records, order, retired = race_positions(rng, session, drivers, SPRINT_LAPS if session['session_name'] == 'Sprint' else RACE_LAPS)
+        write_fixture(fixture_path(directory, year, 'position', key), records)
+        disqualified = rng.choice(order) if rng.random() < 0.05 else None
+        results = [{
+            'position': position, 'driver_number': d, 'session_key': key, 'meeting_key': session['meeting_key'],
+            'dnf': d in retired, 'dns': False, 'dsq': d == disqualified, 'number_of_laps': None,
+        } for position, d in enumerate(order, 1)]
+        write_fixture(fixture_path(directory, year, 'session_result', key), [] if key in no_results else results)
+    return len(sessions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the openf1 api')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='answer from the fixtures')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--latency', type=float, default=0.0, help='seconds before every answer')
+    serve.add_argument('--jitter', type=float, default=0.0, help='up to this many seconds more, at random')
+    serve.add_argument('--rate-429', type=float, default=0.0, help='fraction of the requests answered with a 429')
+    serve.add_argument('--empty-rate', type=float, default=0.0, help='fraction of the session requests answered with no results')
+    serve.add_argument('--retry-after', type=int, default=RETRY_AFTER)
+    serve.add_argument('--seed', type=int, default=None)
+    serve.add_argument('--speed', type=float, default=1.0, help='how much faster than real time the races in the fixtures unfold')
+
+    record = commands.add_parser('record', help='download a season from openf1')
+    record.add_argument('--year', type=int, required=True)
+
+    generate = commands.add_parser('generate', help='make up a season')
+    generate.add_argument('--year', type=int, required=True)
+    generate.add_argument('--seed', type=int, default=0)
+    generate.add_argument('--upcoming', type=int, default=0, help='rounds still to come, the calendar is moved around today')
+    generate.add_argument('--missing-results', type=int, default=1, help='latest races with no /session_result yet')
+    generate.add_argument('--live', action='store_true', help='the race of the first round to come starts now')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        print(f"{record_season(args.year, args.fixtures)} sessions recorded in {args.fixtures}/{args.year}")
+    elif args.command == 'generate':
+        print(f"{generate_season(args.year, args.fixtures, args.seed, args.upcoming, args.missing_results, args.live)} sessions written to {args.fixtures}/{args.year}")
+    else:
+        server = ReplayServer(args.fixtures, args.host, args.port, args.latency, args.jitter, args.rate_429,
+                              args.empty_rate, retry_after=args.retry_after, seed=args.seed, speed=args.speed)
+        print(f"Replaying {len(server.store.sessions)} sessions, OPENF1_BASE_URL={server.base_url}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
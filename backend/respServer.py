@@ -0,0 +1,168 @@
+"""
+Stand-in for a redis server, for testing the redis artifact store( artifactStore.py) without installing redis
+
+    python respServer.py --port 6379
+    F1PLOTS_ARTIFACT_STORE=redis://127.0.0.1:6379/0 ./startingServer.sh
+
+Speaks RESP2 and knows the few commands the store uses: PING, SELECT, GET, SET( NX/XX, EX/PX), DEL, EXISTS, PEXPIRE,
+PERSIST, DBSIZE, FLUSHDB; everything lives in memory, the keys with an expiry are dropped when they are next looked at
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+class RespError(Exception):
+    pass
+
+
+def encode(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, RespError):
+        return b'-ERR %s\r\n' % str(value).encode()
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str):
+        return b'+%s\r\n' % value.encode()
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            # inline command( telnet, redis-cli -x ...)
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        db = 0
+        while True:
+            try:
+                args = self.read_command()
+            except (OSError, ValueError):
+                return
+            if args is None:
+                return
+            if not args:
+                continue
+            name = args[0].upper().decode()
+            if name == 'QUIT':
+                self.wfile.write(encode('OK'))
+                return
+            if name == 'SELECT':
+                db = int(args[1])
+                reply = 'OK'
+            else:
+                try:
+                    reply = self.server.execute(db, name, args[1:])
+                except (RespError, IndexError, ValueError) as e:
+                    reply = RespError(str(e) or 'wrong number of arguments')
+            self.wfile.write(encode(reply))
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    """
+    In-memory databases {db: {key: (value, expires at or None)}}, counts has the commands received by name
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), RespHandler)
+        self.databases = {}
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='resp-server', daemon=True).start()
+        return self.url
+
+    def live_entry(self, data, key):
+        entry = data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del data[key]
+            return None
+        return entry
+
+    def execute(self, db, name, args):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+            data = self.databases.setdefault(db, {})
+            if name == 'PING':
+                return 'PONG'
+            if name == 'GET':
+                entry = self.live_entry(data, args[0])
+                return None if entry is None else entry[0]
+            if name == 'SET':
+                return self.set(data, args)
+            if name == 'DEL':
+                deleted = [key for key in args if self.live_entry(data, key) is not None]
+                for key in deleted:
+                    del data[key]
+                return len(deleted)
+            if name == 'EXISTS':
+                return sum(1 for key in args if self.live_entry(data, key) is not None)
+            if name == 'PEXPIRE':
+                entry = self.live_entry(data, args[0])
+                if entry is None:
+                    return 0
+                data[args[0]] = (entry[0], time.time() + int(args[1]) / 1000)
+                return 1
+            if name == 'PERSIST':
+                entry = self.live_entry(data, args[0])
+                if entry is None or entry[1] is None:
+                    return 0
+                data[args[0]] = (entry[0], None)
+                return 1
+            if name == 'DBSIZE':
+                return sum(1 for key in list(data) if self.live_entry(data, key) is not None)
+            if name == 'FLUSHDB':
+                data.clear()
+                return 'OK'
+            raise RespError(f"unknown command '{name}'")
+
+    def set(self, data, args):
+        key, value = args[0], args[1]
+        options = [arg.upper() for arg in args[2:]]
+        expires = None
+        if b'EX' in options:
+            expires = time.time() + int(args[2 + options.index(b'EX') + 1])
+        if b'PX' in options:
+            expires = time.time() + int(args[2 + options.index(b'PX') + 1]) / 1000
+        exists = self.live_entry(data, key) is not None
+        if (b'NX' in options and exists) or (b'XX' in options and not exists):
+            return None
+        data[key] = (value, expires)
+        return 'OK'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='In-memory stand-in for a redis server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+    server = RespServer(args.host, args.port)
+    print(f"Listening, F1PLOTS_ARTIFACT_STORE={server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
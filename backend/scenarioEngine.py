@@ -0,0 +1,180 @@
+"""
+Who can still win the championship, and how likely: exact maximum points, elimination and clinch, and a Monte Carlo of
+the rest of the season
+
+The sessions left are the Race/Sprint sessions of /sessions that have no results in the standings yet, and every driver
+of the standings can race them: missing a session( injury, a reserve driver in the car) doesn't mean missing the rest,
+only the drivers passed as withdrawn are kept at the points they have
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from seasonModel import RACE_POINTS, SPRINT_POINTS, RACE, SPRINT
+
+
+MONTE_CARLO_SAMPLES = 1_000_000
+# finishing orders drawn once per session type, every simulated session takes one of them at random
+OUTCOME_BANK_SIZE = 8192
+# the sessions left are simulated this many at a time: a bank of sums of that many sessions is drawn first, so a sample
+# is a few row lookups instead of one per session( the order of the sessions doesn't matter for the final points)
+SESSIONS_PER_DRAW = 4
+GROUP_BANK_SIZE = 16384
+# samples simulated together, small enough for the running totals to stay in the cpu cache
+CHUNK_SAMPLES = 32768
+# strength of a driver in the simulation is their points per session so far plus this, so nobody has no chance at all
+FORM_PRIOR = 2.0
+# same data, same probabilities( and the same plot bytes)
+SEED = 0
+
+
+def session_max_points(session_type):
+    return max(SPRINT_POINTS.values()) if session_type == SPRINT else max(RACE_POINTS.values())
+
+
+def remaining_session_types(race_sessions, applied):
+    """
+    RACE/SPRINT of the sessions after the first `applied` ones( race_sessions in date order, like refreshPolicy.race_sessions_of)
+    """
+    return [SPRINT if s.get('session_name') == 'Sprint' else RACE for s in race_sessions[applied:]]
+
+
+def clinch_status(points, in_field, remaining_types):
+    """
+    Exact answers, no simulation: points and in_field are arrays over the drivers
+    Returns max_points( everything still available won by the driver), eliminated( can't reach the leader's points
+    even then; reaching them exactly still counts as alive, the tie would go to countback) and the index of the driver
+    that clinched the title( nobody else can reach them) or None
+    """
+    remaining_max = sum(session_max_points(t) for t in remaining_types)
+    max_points = points + np.where(in_field, remaining_max, 0)
+    eliminated = max_points < points.max() if len(points) else np.zeros(0, dtype=bool)
+    alive = np.flatnonzero(~eliminated)
+    clinched = int(alive[0]) if len(alive) == 1 else None
+    return max_points, eliminated, clinched
+
+
+def points_by_position(session_type, field_size):
+    table = SPRINT_POINTS if session_type == SPRINT else RACE_POINTS
+    return np.array([table.get(position, 0) for position in range(1, field_size + 1)], dtype=np.int16)
+
+
+def outcome_bank(weights, session_type, size, rng):
+    """
+    size finishing orders of the field drawn from a Plackett-Luce model( Gumbel trick: sort log(weight) + Gumbel noise),
+    as the points each driver gets, (size x drivers) int16
+    """
+    field_size = len(weights)
+    keys = np.log(weights) + rng.gumbel(size=(size, field_size))
+    order = np.argsort(-keys, axis=1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(field_size), axis=1)
+    return points_by_position(session_type, field_size)[ranks]
+
+
+def group_banks(banks, remaining_types, rng):
+    """
+    Banks of the points of SESSIONS_PER_DRAW sessions at a time( sprints grouped with sprints as far as possible),
+    every row the sum of independent rows of the single session banks
+    """
+    ordered = sorted(remaining_types)
+    groups = [tuple(ordered[i:i + SESSIONS_PER_DRAW]) for i in range(0, len(ordered), SESSIONS_PER_DRAW)]
+    built = {}
+    for group in set(groups):
+        total = np.zeros((GROUP_BANK_SIZE, banks[group[0]].shape[1]), dtype=np.int16)
+        for session_type in group:
+            total += banks[session_type][rng.integers(0, OUTCOME_BANK_SIZE, GROUP_BANK_SIZE)]
+        built[group] = total
+    return [built[group] for group in groups]
+
+
+def simulate_part(base, draws, samples, seed):
+    """
+    Title wins( ties split evenly) of each column of base over `samples` simulated rests of the season, the rest of the
+    season being one row of every bank in draws
+    """
+    rng = np.random.default_rng(seed)
+    wins = np.zeros(base.shape[0])
+    for start in range(0, samples, CHUNK_SAMPLES):
+        n = min(CHUNK_SAMPLES, samples - start)
+        totals = np.repeat(base[np.newaxis, :], n, axis=0)
+        indices = rng.integers(0, GROUP_BANK_SIZE, size=(len(draws), n), dtype=np.int32)
+        for bank, index in zip(draws, indices):
+            totals += bank[index]
+        leaders = totals == totals.max(axis=1, keepdims=True)
+        wins += (leaders / leaders.sum(axis=1, keepdims=True)).sum(axis=0)
+    return wins
+
+
+def title_probabilities(points, form, in_field, remaining_types, samples=MONTE_CARLO_SAMPLES, seed=SEED, processes=1):
+    """
+    Probability of each driver winning the title, from `samples` simulated rests of the season
+    Every remaining session is a finishing order of the drivers in the field, drawn with a chance proportional to
+    form + FORM_PRIOR( form = points per session so far); only drivers that are not eliminated are tracked, the
+    others can't end up first anyway
+    processes > 1 splits the samples over that many processes
+    """
+    points = np.asarray(points, dtype=np.int32)
+    probabilities = np.zeros(len(points))
+    _, eliminated, clinched = clinch_status(points, in_field, remaining_types)
+    if clinched is not None or not remaining_types:
+        best = points == points.max() if len(points) else points
+        return best / max(1, best.sum()) if clinched is None else np.eye(len(points))[clinched]
+
+    field = np.flatnonzero(in_field)
+    weights = np.asarray(form, dtype=float)[field] + FORM_PRIOR
+    # columns that are tracked: contenders, in the field or not
+    tracked = np.flatnonzero(~eliminated)
+    field_column = {driver: column for column, driver in enumerate(field)}
+    seeds = np.random.SeedSequence(seed).spawn(processes + 1)
+    rng = np.random.default_rng(seeds[0])
+    banks = {}
+    for session_type in set(remaining_types):
+        bank = outcome_bank(weights, session_type, OUTCOME_BANK_SIZE, rng)
+        tracked_bank = np.zeros((OUTCOME_BANK_SIZE, len(tracked)), dtype=np.int16)
+        for column, driver in enumerate(tracked):
+            if driver in field_column:
+                tracked_bank[:, column] = bank[:, field_column[driver]]
+        banks[session_type] = tracked_bank
+    draws = group_banks(banks, remaining_types, rng)
+    # a season is well below 32767 points
+    base = points[tracked].astype(np.int16)
+
+    if processes > 1:
+        parts = [samples // processes + (i < samples % processes) for i in range(processes)]
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+            wins = sum(pool.map(simulate_part, [base] * processes, [draws] * processes, parts, seeds[1:]))
+    else:
+        wins = simulate_part(base, draws, samples, seeds[1])
+    probabilities[tracked] = wins / samples
+    return probabilities
+
+
+def season_scenarios(complete_standings, driver_positions, remaining_types, samples=MONTE_CARLO_SAMPLES, processes=1, withdrawn=()):
+    """
+    Everything above for the drivers of complete_standings( in that order), driver_positions is what
+    get_all_season_results gives( one entry per session so far, None where the driver didn't take part), withdrawn the
+    driver numbers known not to race again this season
+    Returns {'max_points', 'eliminated', 'title_probability': lists in standings order, 'clinched': driver number or None,
+    'remaining_races', 'remaining_sprints', 'remaining_points'( the most a driver can still add), 'samples'}
+    """
+    numbers = [driver_num for driver_num, _, _, _, _ in complete_standings]
+    points = np.array([points for _, points, _, _, _ in complete_standings], dtype=np.int32)
+    raced = [[p for p in driver_positions.get(d, []) if p is not None] for d in numbers]
+    form = np.array([points[i] / len(raced[i]) if raced[i] else 0.0 for i in range(len(numbers))])
+    # a None in the last session is not enough to say a driver is out for good, it could be a single missed weekend
+    in_field = np.array([d not in withdrawn for d in numbers], dtype=bool)
+
+    max_points, eliminated, clinched = clinch_status(points, in_field, remaining_types)
+    probabilities = title_probabilities(points, form, in_field, remaining_types, samples, processes=processes) if numbers else []
+    return {
+        'max_points': [int(p) for p in max_points],
+        'eliminated': [bool(e) for e in eliminated],
+        'title_probability': [round(float(p), 4) for p in probabilities],
+        'clinched': None if clinched is None else numbers[clinched],
+        'remaining_races': remaining_types.count(RACE),
+        'remaining_sprints': remaining_types.count(SPRINT),
+        'remaining_points': sum(session_max_points(t) for t in remaining_types),
+        'samples': samples if remaining_types and clinched is None else 0,
+    }
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from plotRenderer import ARTIFACT_VARIANTS
+
+
+# first season covered by openf1
+FIRST_SEASON = 2023
+
+# past seasons are rendered once and kept here for good: static/seasons/YEAR/plot1.png etc.
+SEASONS_DIR = 'static/seasons'
+PLOTS = ['plot1', 'plot2']
+# the season as json( see season_document in plotGenerator.py), next to the plots
+SEASON_DATA_FILE = 'data.json'
+
+
+def current_variants():
+    return [suffix for suffix, _, _, _ in ARTIFACT_VARIANTS]
+
+
+def season_variant_path(plot, suffix, year):
+    return f'{SEASONS_DIR}/{year}/{plot}{suffix}'
+
+
+def season_data_path(year):
+    return f'{SEASONS_DIR}/{year}/{SEASON_DATA_FILE}'
+
+
+def season_manifest_path(year):
+    # written after all the files of a past season, its presence means the season is complete on disk
+    return f'{SEASONS_DIR}/{year}/season.json'
+
+
+def load_season_manifest(year):
+    try:
+        with open(season_manifest_path(year)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def season_is_complete(manifest):
+    """
+    True if the season of the manifest is on disk with every variant the renderer makes now
+    """
+    if manifest is None or manifest.get('variants') != current_variants():
+        return False
+    if not os.path.exists(season_data_path(manifest['year'])):
+        return False
+    return all(os.path.exists(season_variant_path(plot, suffix, manifest['year'])) for plot in PLOTS for suffix in manifest['variants'])
+
+
+def publish_season(year, artifacts, season_data, inputs=None, final=True):
+    """
+    Write the variants of both plots of a past season( artifacts as render_artifacts gives them) and its json, then its
+    manifest with the sha256 of every file and the fingerprint of the data they were rendered from
+    final False is a season that wasn't all there when it was rendered, served but not pinned( see flaskServer.is_pinned)
+    Returns the manifest
+    """
+    publish_file(season_data_path(year), season_data)
+    hashes = {SEASON_DATA_FILE: hashlib.sha256(season_data).hexdigest()}
+    for plot, variants in zip(PLOTS, artifacts):
+        for suffix, data in variants.items():
+            publish_file(season_variant_path(plot, suffix, year), data)
+            hashes[plot + suffix] = hashlib.sha256(data).hexdigest()
+    manifest = {'year': year, 'variants': current_variants(), 'inputs': inputs, 'final': final, 'rendered': time.time(), 'artifacts': hashes}
+    publish_file(season_manifest_path(year), json.dumps(manifest, indent=1).encode())
+    return manifest
+
+
+def publish_file(path, data):
+    """
+    Write to a temp file in the same directory and rename it over the old one, readers see either the old or the new file, never half of one
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,114 @@
+"""
+Pre-build every past season openf1 covers, so the server has them pinned before anyone asks( ?year=, see flaskServer.py)
+
+    python seasonBackfill.py                  # FIRST_SEASON up to last year
+    python seasonBackfill.py --from 2024 --to 2024 --force
+
+The seasons are downloaded one after the other in this process, through the cache and the rate limiter like the server
+does, and every season is handed to a pool of processes( one per core) for the rendering as soon as its data is in,
+since matplotlib is CPU bound and holds the GIL
+A season whose data, variants and renderer are the same as in its season.json is skipped, static/seasons/manifest.json
+lists the content hashes of every file of every season; the rendered seasons are pushed to the artifact store too
+( F1PLOTS_ARTIFACT_STORE, see artifactStore.py), so the servers of every host find them there
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+from apiConnect import get_all_season_results, season_is_final
+from artifactStore import StoreError, open_store, publish_season_artifacts
+from plotGenerator import plot_data_from_results, inputs_fingerprint, season_document
+from plotRenderer import render_artifacts
+from seasonArtifacts import FIRST_SEASON, SEASONS_DIR, load_season_manifest, season_is_complete, publish_season, publish_file
+
+
+BACKFILL_MANIFEST_PATH = f'{SEASONS_DIR}/manifest.json'
+
+
+def backfill(first_year, last_year, force=False, workers=None):
+    """
+    Fetch, render and pin the seasons from first_year to last_year, returns {year: 'rendered'|'unchanged'|'incomplete'|'failed: ...'}
+    """
+    outcome = {}
+    # the current season still changes, it is the server's job
+    last_year = min(last_year, datetime.date.today().year - 1)
+    workers = workers or os.cpu_count() or 1
+    store = open_store()
+    # spawn and not fork: this process has the threads of the http pool and the session downloads running
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        renders = {}
+        for year in range(first_year, last_year + 1):
+            start = time.perf_counter()
+            try:
+                data = plot_data_from_results(get_all_season_results(year, incremental=True), year)
+            except requests.exceptions.RequestException as e:
+                outcome[year] = f'failed: {e}'
+                continue
+            print(f"{year}: fetched in {time.perf_counter() - start:.1f} s")
+            if not season_is_final(year):
+                # sessions missing or only from the /position fallback, the server renders it when it is complete
+                outcome[year] = 'incomplete'
+                continue
+
+            inputs = inputs_fingerprint(data)
+            manifest = load_season_manifest(year)
+            if not force and season_is_complete(manifest) and manifest.get('final') and manifest.get('inputs') == inputs:
+                outcome[year] = 'unchanged'
+                continue
+            renders[year] = (inputs, season_document(data), time.perf_counter(), pool.submit(render_artifacts, *data))
+
+        for year, (inputs, season_data, submitted, future) in renders.items():
+            try:
+                artifacts = future.result()
+            except Exception as e:
+                outcome[year] = f'failed: {e}'
+                continue
+            publish_season(year, artifacts, season_data, inputs=inputs)
+            try:
+                publish_season_artifacts(store, year, artifacts, season_data, inputs)
+            except (StoreError, OSError) as e:
+                # pinned here anyway, the producer pushes it when a replica asks for it
+                print(f"{year}: not pushed to the artifact store: {e}")
+            outcome[year] = 'rendered'
+            print(f"{year}: rendered and published {time.perf_counter() - submitted:.1f} s after its data was in")
+
+    write_backfill_manifest()
+    return outcome
+
+
+def write_backfill_manifest():
+    """
+    The manifests of every season on disk in one file
+    """
+    seasons = {}
+    if os.path.isdir(SEASONS_DIR):
+        for name in sorted(os.listdir(SEASONS_DIR)):
+            manifest = load_season_manifest(name) if name.isdigit() else None
+            if manifest is not None:
+                seasons[name] = manifest
+    publish_file(BACKFILL_MANIFEST_PATH, json.dumps({'generated': time.time(), 'seasons': seasons}, indent=1).encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render and pin every past season')
+    parser.add_argument('--from', dest='first_year', type=int, default=FIRST_SEASON)
+    parser.add_argument('--to', dest='last_year', type=int, default=datetime.date.today().year - 1)
+    parser.add_argument('--force', action='store_true', help='render even the seasons that did not change')
+    parser.add_argument('--workers', type=int, default=None, help='rendering processes, one per core by default')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    outcome = backfill(args.first_year, args.last_year, force=args.force, workers=args.workers)
+    for year, result in outcome.items():
+        print(f"{year}: {result}")
+    print(f"Done in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
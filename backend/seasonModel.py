@@ -0,0 +1,198 @@
+import numpy as np
+
+
+# F1 Points system
+RACE_POINTS = {
+    1: 25, 2: 18, 3: 15, 4: 12, 5: 10, 6: 8, 7: 6, 8: 4, 9: 2, 10: 1
+}
+
+SPRINT_POINTS = {
+    1: 8, 2: 7, 3: 6, 4: 5, 5: 4, 6: 3, 7: 2, 8: 1
+}
+
+# values of the position matrix that are not a finishing position
+NO_ENTRY = 0            # the driver did not take part in the session
+DNF = -1
+DSQ = -2
+DNS = -3
+UNCLASSIFIED = -4       # took part, but the api gives no position
+
+STATUS_CODES = {'dnf': DNF, 'dsq': DSQ, 'dns': DNS}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+RACE = 0
+SPRINT = 1
+
+# highest position the lookup tables cover, there are never more than 20-something cars
+MAX_POSITION = 32
+
+
+def points_lookup_table(race_points=None, sprint_points=None):
+    """
+    Points as a (session type, position) array, so the points of a whole season are a single fancy-indexing lookup
+    Row RACE/SPRINT, column = position( column 0 is for every non finishing code and is always 0)
+    """
+    race_points = RACE_POINTS if race_points is None else race_points
+    sprint_points = SPRINT_POINTS if sprint_points is None else sprint_points
+    table = np.zeros((2, MAX_POSITION + 1), dtype=np.int32)
+    for position, points in race_points.items():
+        table[RACE, position] = points
+    for position, points in sprint_points.items():
+        table[SPRINT, position] = points
+    return table
+
+
+class SeasonModel:
+    """
+    Columnar model of a season: one row per driver, one column per Race/Sprint session
+
+    - positions: int16 (drivers x sessions) matrix, finishing position or one of the codes above
+    - session_types: RACE/SPRINT per session, session_names/session_keys alongside
+    - driver_numbers/driver_index: row of each driver, in order of first appearance( the order of the old dicts)
+
+    Points come from a lookup table and the history from a cumsum, to_season_results gives back the exact
+    dictionaries get_all_season_results always returned
+    """
+
+    def __init__(self):
+        self.driver_numbers = []
+        self.driver_index = {}
+        self.session_names = []
+        self.session_keys = []
+        # storage grows by doubling, the model is the [:n_drivers, :n_sessions] corner of it
+        self._positions = np.zeros((24, 32), dtype=np.int16)
+        self._session_types = np.zeros(32, dtype=np.int8)
+
+    @property
+    def n_drivers(self):
+        return len(self.driver_numbers)
+
+    @property
+    def n_sessions(self):
+        return len(self.session_names)
+
+    @property
+    def positions(self):
+        return self._positions[:self.n_drivers, :self.n_sessions]
+
+    @property
+    def session_types(self):
+        return self._session_types[:self.n_sessions]
+
+    @property
+    def nbytes(self):
+        """
+        Rough memory footprint, the numpy storage plus about 100 bytes per driver/session for the python lists and dicts
+        """
+        return self._positions.nbytes + self._session_types.nbytes + 100 * (self.n_drivers + self.n_sessions)
+
+    def _grow(self, n_drivers, n_sessions):
+        rows, cols = self._positions.shape
+        if n_drivers <= rows and n_sessions <= cols:
+            return
+        new_rows = rows if n_drivers <= rows else max(rows * 2, n_drivers)
+        new_cols = cols if n_sessions <= cols else max(cols * 2, n_sessions)
+        positions = np.zeros((new_rows, new_cols), dtype=np.int16)
+        positions[:rows, :cols] = self._positions
+        session_types = np.zeros(new_cols, dtype=np.int8)
+        session_types[:cols] = self._session_types
+        self._positions, self._session_types = positions, session_types
+
+    def add_session(self, session_key, session_name, is_sprint, cleaned_positions):
+        """
+        Append a session, cleaned_positions is {driver_number: position or 'dnf'/'dsq'/'dns'/None}
+        """
+        column = self.n_sessions
+        for driver_num in cleaned_positions:
+            if driver_num not in self.driver_index:
+                self.driver_index[driver_num] = len(self.driver_numbers)
+                self.driver_numbers.append(driver_num)
+        self._grow(self.n_drivers, column + 1)
+
+        rows = np.fromiter((self.driver_index[d] for d in cleaned_positions), dtype=np.intp, count=len(cleaned_positions))
+        codes = np.fromiter((encode_position(p) for p in cleaned_positions.values()), dtype=np.int16, count=len(cleaned_positions))
+        self._positions[:, column] = NO_ENTRY
+        self._positions[rows, column] = codes
+        self._session_types[column] = SPRINT if is_sprint else RACE
+        self.session_names.append(session_name)
+        self.session_keys.append(session_key)
+
+    def points_matrix(self, race_points=None, sprint_points=None):
+        """
+        Points scored by each driver in each session, other scoring systems can be passed for what-ifs
+        """
+        table = points_lookup_table(race_points, sprint_points)
+        positions = self.positions
+        columns = np.clip(positions, 0, MAX_POSITION)
+        return table[self.session_types[np.newaxis, :], columns]
+
+    def history(self, race_points=None, sprint_points=None):
+        """
+        Cumulative points of each driver after each session
+        """
+        return np.cumsum(self.points_matrix(race_points, sprint_points), axis=1)
+
+    def total_points(self, race_points=None, sprint_points=None):
+        return self.points_matrix(race_points, sprint_points).sum(axis=1)
+
+    def to_season_results(self, driver_names, driver_teams, driver_colors):
+        """
+        The values get_all_season_results returns, built from the matrices
+        """
+        history = self.history().tolist()
+        positions = self.positions.tolist()
+        driver_positions = {}
+        driver_points = {}
+        driver_history = {}
+        for row, driver_num in enumerate(self.driver_numbers):
+            driver_positions[driver_num] = [decode_position(p) for p in positions[row]]
+            driver_history[driver_num] = history[row]
+            driver_points[driver_num] = history[row][-1] if history[row] else 0
+        return driver_positions, driver_points, driver_names, driver_teams, driver_colors, driver_history, list(self.session_names), self.n_sessions
+
+    def to_state(self):
+        """
+        Json friendly snapshot, see from_state
+        """
+        return {
+            'driver_numbers': list(self.driver_numbers),
+            'session_names': list(self.session_names),
+            'session_keys': list(self.session_keys),
+            'session_types': self.session_types.tolist(),
+            'positions': self.positions.tolist(),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        model = cls()
+        model.driver_numbers = list(state['driver_numbers'])
+        model.driver_index = {d: i for i, d in enumerate(model.driver_numbers)}
+        model.session_names = list(state['session_names'])
+        model.session_keys = list(state['session_keys'])
+        model._grow(model.n_drivers, model.n_sessions)
+        if model.n_drivers and model.n_sessions:
+            model._positions[:model.n_drivers, :model.n_sessions] = np.array(state['positions'], dtype=np.int16)
+        model._session_types[:model.n_sessions] = np.array(state['session_types'], dtype=np.int8)
+        return model
+
+
+def encode_position(position):
+    """
+    Position as stored in the matrix
+    """
+    if isinstance(position, str):
+        return STATUS_CODES[position]
+    if position is None:
+        return UNCLASSIFIED
+    return position
+
+
+def decode_position(code):
+    """
+    Inverse of encode_position, drivers that did not take part get None like before
+    """
+    if code > 0:
+        return code
+    if code in STATUS_NAMES:
+        return STATUS_NAMES[code]
+    return None
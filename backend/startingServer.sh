@@ -1,2 +1,2 @@
 #!/bin/bash
-gunicorn --bind 0.0.0.0:5000 flaskServer:app
+gunicorn -c gunicorn.conf.py flaskServer:app
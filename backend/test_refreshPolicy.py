@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta, timezone
+
+from apiCache import FINALIZE_DELAY, PROVISIONAL_MAX_AGE
+from refreshPolicy import IDLE_POLL_INTERVAL, next_check_time
+
+
+NOW = datetime.now(timezone.utc)
+
+
+def session(key, ended_ago):
+    end = NOW - timedelta(seconds=ended_ago)
+    return {'session_key': key, 'session_name': 'Race', 'country_name': 'Italy',
+            'date_start': (end - timedelta(hours=2)).isoformat(), 'date_end': end.isoformat()}
+
+
+def test_final_session_with_official_results_is_idle():
+    next_check, reason = next_check_time([session(1, FINALIZE_DELAY + 3600)], [], now=NOW)
+    assert reason == 'idle'
+    assert next_check == (NOW + timedelta(seconds=IDLE_POLL_INTERVAL)).timestamp()
+
+
+def test_final_session_with_only_the_fallback_is_checked_hourly():
+    next_check, reason = next_check_time([session(1, FINALIZE_DELAY + 3600)], [], now=NOW, provisional=[1])
+    assert reason == 'waiting for Italy Race official results'
+    assert next_check == (NOW + timedelta(seconds=PROVISIONAL_MAX_AGE)).timestamp()
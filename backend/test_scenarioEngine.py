@@ -0,0 +1,28 @@
+from scenarioEngine import season_scenarios
+from seasonModel import RACE
+
+
+def standings(*points):
+    # (driver_num, points, name, team, color) like plotGenerator gives them
+    return [(i + 1, p, f'D{i + 1}', 'Team', '777777') for i, p in enumerate(points)]
+
+
+def test_driver_that_missed_last_session_is_still_in_it():
+    # B missed the previous race, one race left: 290 + 25 can still beat 300
+    result = season_scenarios(standings(300, 290), {1: [1, 1], 2: [1, None]}, [RACE], samples=1000)
+    assert result['max_points'] == [325, 315]
+    assert result['eliminated'] == [False, False]
+    assert result['clinched'] is None
+
+
+def test_driver_that_missed_last_session_is_simulated():
+    # one point behind, winning the last race is enough
+    result = season_scenarios(standings(300, 299), {1: [1, 1], 2: [1, None]}, [RACE], samples=1000)
+    assert 0 < result['title_probability'][1] < 1
+
+
+def test_withdrawn_driver_keeps_their_points():
+    result = season_scenarios(standings(300, 290), {1: [1, 1], 2: [1, None]}, [RACE], samples=1000, withdrawn=(2,))
+    assert result['max_points'] == [325, 290]
+    assert result['eliminated'] == [False, True]
+    assert result['clinched'] == 1